@@ -1,8 +1,9 @@
-import json
 import os
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional
+from typing import Literal, Optional
 
+import orjson
 from pydantic import Field
 from pydantic_settings import BaseSettings
 
@@ -19,9 +20,19 @@ class Settings(BaseSettings):
     telegram_bot_token: str = Field(default="")
     telegram_chat_id: str = Field(default="")
     data_dir: Path = Field(default=Path("./data"))
+    # Point at a tmpfs path (e.g. /dev/shm/hls) to keep live segments off disk
+    hls_dir: Optional[Path] = Field(default=None)
+    # Use data/models/mobilenet_ssd_int8.onnx instead of the FP32 Caffe model
+    detector_quantized: bool = Field(default=False)
+    # "none" skips MOG2 and runs the DNN on a fixed frame cadence (for hardware with a fast DNN)
+    motion_gate: Literal["mog2", "none"] = Field(default="mog2")
     host: str = Field(default="0.0.0.0")
     port: int = Field(default=8000)
 
+    @property
+    def hls_output_dir(self) -> Path:
+        return self.hls_dir or self.data_dir / "hls"
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
@@ -33,8 +44,22 @@ class RuntimeSettings:
     _instance: Optional["RuntimeSettings"] = None
     _settings_file: Path
 
+    # Fixed schema; _build_dict() and update() are generated from this below
+    FIELDS = (
+        "telegram_enabled",
+        "telegram_screenshot",
+        "telegram_gif",
+        "detection_threshold",
+        "retention_hours",
+        "theme",
+        "notification_cooldown_seconds",
+        "stream_type",
+        "clip_scale",
+    )
+
     def __init__(self, settings_file: Path):
         self._settings_file = settings_file
+        self._dict_cache: Optional[dict] = None
         self._load()
 
     @classmethod
@@ -46,12 +71,12 @@ class RuntimeSettings:
         return cls._instance
 
     def _load(self):
-        if self._settings_file.exists():
-            with open(self._settings_file, "r") as f:
-                data = json.load(f)
-        else:
+        try:
+            data = orjson.loads(self._settings_file.read_bytes())
+        except FileNotFoundError:
             data = {}
 
+        self._dict_cache = None
         self.telegram_enabled: bool = data.get("telegram_enabled", True)
         self.telegram_screenshot: bool = data.get("telegram_screenshot", True)
         self.telegram_gif: bool = data.get("telegram_gif", True)
@@ -60,31 +85,67 @@ class RuntimeSettings:
         self.theme: str = data.get("theme", "dark")
         self.notification_cooldown_seconds: int = data.get("notification_cooldown_seconds", 60)
         self.stream_type: int = data.get("stream_type", 0)
+        self.clip_scale: bool = data.get("clip_scale", False)
 
     def save(self):
         self._settings_file.parent.mkdir(parents=True, exist_ok=True)
-        with open(self._settings_file, "w") as f:
-            json.dump(self.to_dict(), f, indent=2)
+        self._settings_file.write_bytes(
+            orjson.dumps(self.to_dict(), option=orjson.OPT_INDENT_2)
+        )
 
     def to_dict(self) -> dict:
-        return {
-            "telegram_enabled": self.telegram_enabled,
-            "telegram_screenshot": self.telegram_screenshot,
-            "telegram_gif": self.telegram_gif,
-            "detection_threshold": self.detection_threshold,
-            "retention_hours": self.retention_hours,
-            "theme": self.theme,
-            "notification_cooldown_seconds": self.notification_cooldown_seconds,
-            "stream_type": self.stream_type,
-        }
-
-    def update(self, **kwargs):
-        for key, value in kwargs.items():
-            if hasattr(self, key):
-                setattr(self, key, value)
-        self.save()
-
-
-# Global instances
-settings = Settings()
-runtime_settings = RuntimeSettings.get_instance(Path("config/settings.json"))
+        """Return settings as a dict, cached until the next load or update."""
+        if self._dict_cache is None:
+            self._dict_cache = self._build_dict()
+        return self._dict_cache
+
+
+def _specialize_runtime_settings(cls: type) -> type:
+    """Generate straight-line _build_dict() and update() for the known fields.
+
+    Avoids per-call reflection (hasattr/setattr over kwargs) on a schema that
+    never changes at runtime.
+    """
+    fields = cls.FIELDS
+    source = (
+        "def _build_dict(self):\n"
+        "    return {" + ", ".join(f"{name!r}: self.{name}" for name in fields) + "}\n"
+        "\n"
+        "def update(self, **kwargs):\n"
+        + "".join(
+            f"    if {name!r} in kwargs:\n"
+            f"        self.{name} = kwargs[{name!r}]\n"
+            for name in fields
+        )
+        + "    self._dict_cache = None\n"
+        "    self.save()\n"
+    )
+    namespace: dict = {}
+    exec(compile(source, f"<{cls.__name__} specialized>", "exec"), {}, namespace)
+    cls._build_dict = namespace["_build_dict"]
+    cls.update = namespace["update"]
+    return cls
+
+
+_specialize_runtime_settings(RuntimeSettings)
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Return the application settings, parsing the environment on first use."""
+    return Settings()
+
+
+@lru_cache(maxsize=1)
+def get_runtime_settings() -> RuntimeSettings:
+    """Return the runtime settings, reading the settings file on first use."""
+    return RuntimeSettings.get_instance(Path("config/settings.json"))
+
+
+def __getattr__(name: str):
+    # Global instances, materialized lazily on first access
+    if name == "settings":
+        return get_settings()
+    if name == "runtime_settings":
+        return get_runtime_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
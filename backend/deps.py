@@ -0,0 +1,41 @@
+from fastapi import HTTPException, Request
+
+from backend.services.event_store import EventStore
+from backend.services.hls_streamer import HLSStreamer
+from backend.services.notification import NotificationService
+from backend.services.person_detector import PersonDetector
+from backend.services.rtsp_recorder import RTSPRecorder
+from backend.services.storage_manager import StorageManager
+
+
+def require_ready(request: Request) -> None:
+    """Reject requests until deferred service initialization has completed."""
+    if not getattr(request.app.state, "ready", False):
+        raise HTTPException(
+            status_code=503,
+            detail="Services are starting. Please wait a few seconds."
+        )
+
+
+def get_event_store(request: Request) -> EventStore:
+    return request.app.state.event_store
+
+
+def get_recorder(request: Request) -> RTSPRecorder:
+    return request.app.state.recorder
+
+
+def get_hls_streamer(request: Request) -> HLSStreamer:
+    return request.app.state.hls_streamer
+
+
+def get_detector(request: Request) -> PersonDetector:
+    return request.app.state.detector
+
+
+def get_storage_manager(request: Request) -> StorageManager:
+    return request.app.state.storage_manager
+
+
+def get_notification_service(request: Request) -> NotificationService:
+    return request.app.state.notification_service
@@ -1,15 +1,19 @@
 import asyncio
 import logging
-import shutil
+import os
+import signal
 from contextlib import asynccontextmanager
 from pathlib import Path
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import Depends, FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 
-from backend.config import settings, runtime_settings
+from backend import config
+from backend.deps import require_ready
 from backend.routers import stream, recordings, detection, settings as settings_router, storage
+from backend.services.hw_encoder import FFMPEG_PATH
 from backend.services.rtsp_recorder import RTSPRecorder
 from backend.services.hls_streamer import HLSStreamer
 from backend.services.person_detector import PersonDetector
@@ -25,6 +29,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Precomputed heartbeat reply, sent without per-message encoding
+_PONG = b'{"type": "pong"}'
+
 # Service instances
 recorder: RTSPRecorder = None
 hls_streamer: HLSStreamer = None
@@ -36,71 +43,64 @@ notification_service: NotificationService = None
 
 def check_ffmpeg():
     """Verify FFmpeg is installed."""
-    if not shutil.which("ffmpeg"):
+    if not FFMPEG_PATH:
         raise RuntimeError("FFmpeg not found. Please install FFmpeg.")
-    logger.info("FFmpeg found")
+    logger.info(f"FFmpeg found at {FFMPEG_PATH}")
 
 
 def setup_directories():
     """Create required data directories."""
     dirs = [
-        settings.data_dir / "recordings",
-        settings.data_dir / "hls",
-        settings.data_dir / "detections",
-        settings.data_dir / "thumbnails",
+        config.settings.data_dir / "recordings",
+        config.settings.hls_output_dir,
+        config.settings.data_dir / "detections",
+        config.settings.data_dir / "thumbnails",
     ]
     for d in dirs:
         d.mkdir(parents=True, exist_ok=True)
-    logger.info(f"Data directories ready at {settings.data_dir}")
+    logger.info(f"Data directories ready at {config.settings.data_dir}")
 
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    """Application lifespan manager."""
+async def _deferred_init(app: FastAPI):
+    """Construct and start services once the server is already accepting connections."""
     global recorder, hls_streamer, detector, storage_manager, event_store, notification_service
 
-    # Startup
-    logger.info("Starting Security Camera Dashboard...")
-
-    check_ffmpeg()
-    setup_directories()
-
-    # All services use HIGH quality stream (streamtype=0)
-    # Low quality stream appears to be broken/audio-only on this camera
-    logger.info(f"Using stream: {settings.rtsp_url_high}")
-
     # Initialize services
-    event_store = EventStore(settings.data_dir / "detections" / "events.db")
+    event_store = EventStore(config.settings.data_dir / "detections" / "events.db")
     await event_store.initialize()
 
     notification_service = NotificationService(
-        bot_token=settings.telegram_bot_token,
-        chat_id=settings.telegram_chat_id,
-        data_dir=settings.data_dir
+        bot_token=config.settings.telegram_bot_token,
+        chat_id=config.settings.telegram_chat_id,
+        data_dir=config.settings.data_dir
     )
 
     storage_manager = StorageManager(
-        data_dir=settings.data_dir,
+        data_dir=config.settings.data_dir,
         ws_manager=ws_manager
     )
 
     detector = PersonDetector(
-        rtsp_url=settings.rtsp_url_high,
+        rtsp_url=config.settings.rtsp_url_high,
         event_store=event_store,
         notification_service=notification_service,
         ws_manager=ws_manager,
-        thumbnails_dir=settings.data_dir / "thumbnails"
+        thumbnails_dir=config.settings.data_dir / "thumbnails"
     )
+    # Alert clips are cut from the detector's frame buffer instead of a new RTSP session
+    notification_service.frame_source = detector
 
     recorder = RTSPRecorder(
-        rtsp_url=settings.rtsp_url_high,
-        output_dir=settings.data_dir / "recordings",
+        rtsp_url=config.settings.rtsp_url_high,
+        output_dir=config.settings.data_dir / "recordings",
         ws_manager=ws_manager
     )
+    # Finished segments keep the storage totals current between full walks
+    recorder.storage_manager = storage_manager
 
     hls_streamer = HLSStreamer(
-        rtsp_url=settings.rtsp_url_high,  # Use high quality (low quality is broken)
-        output_dir=settings.data_dir / "hls",
+        rtsp_url=config.settings.rtsp_url_high,  # Use high quality (low quality is broken)
+        output_dir=config.settings.hls_output_dir,
         ws_manager=ws_manager
     )
 
@@ -111,7 +111,6 @@ async def lifespan(app: FastAPI):
     app.state.storage_manager = storage_manager
     app.state.event_store = event_store
     app.state.notification_service = notification_service
-    app.state.ws_manager = ws_manager
 
     # Start services
     asyncio.create_task(recorder.start())
@@ -119,25 +118,76 @@ async def lifespan(app: FastAPI):
     asyncio.create_task(detector.start())
     asyncio.create_task(storage_manager.start_cleanup_task())
 
+    app.state.ready = True
     logger.info("All services started")
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application lifespan manager."""
+    # Startup
+    logger.info("Starting Security Camera Dashboard...")
+
+    check_ffmpeg()
+    setup_directories()
+
+    # All services use HIGH quality stream (streamtype=0)
+    # Low quality stream appears to be broken/audio-only on this camera
+    logger.info(f"Using stream: {config.settings.rtsp_url_high}")
+
+    # Bind the port immediately; routers answer 503 until services are ready
+    app.state.ready = False
+    app.state.init_error = None
+    app.state.ws_manager = ws_manager
+    init_task = asyncio.create_task(_deferred_init(app))
+    init_task.add_done_callback(lambda task: _handle_init_failure(app, task))
+
     yield
 
     # Shutdown
     logger.info("Shutting down services...")
-    await recorder.stop()
-    await hls_streamer.stop()
-    await detector.stop()
-    await storage_manager.stop()
-    await event_store.close()
+    if not init_task.done():
+        init_task.cancel()
+        try:
+            await init_task
+        except asyncio.CancelledError:
+            pass
+
+    if recorder:
+        await recorder.stop()
+    if hls_streamer:
+        await hls_streamer.stop()
+    if detector:
+        await detector.stop()
+    if storage_manager:
+        await storage_manager.stop()
+    if notification_service:
+        await notification_service.close()
+    if event_store:
+        await event_store.close()
     logger.info("Shutdown complete")
 
 
+def _handle_init_failure(app: FastAPI, task: asyncio.Task):
+    """Record a deferred initialization error and shut the server down.
+
+    Without services the process would stay up but never become ready, so
+    stop it and let the supervisor (systemd Restart=always) try again.
+    """
+    if task.cancelled() or task.exception() is None:
+        return
+    error = task.exception()
+    app.state.init_error = str(error) or type(error).__name__
+    logger.error(f"Service initialization failed, shutting down: {app.state.init_error}", exc_info=error)
+    os.kill(os.getpid(), signal.SIGTERM)
+
+
 # Create FastAPI app
 app = FastAPI(
     title="Security Camera Dashboard",
     description="RTSP stream monitoring with person detection",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
@@ -151,20 +201,22 @@ app.add_middleware(
 )
 
 # Include routers
-app.include_router(stream.router, prefix="/api/stream", tags=["Stream"])
-app.include_router(recordings.router, prefix="/api/recordings", tags=["Recordings"])
-app.include_router(detection.router, prefix="/api/detections", tags=["Detection"])
+# Routers backed by services return 503 until deferred initialization completes
+service_deps = [Depends(require_ready)]
+app.include_router(stream.router, prefix="/api/stream", tags=["Stream"], dependencies=service_deps)
+app.include_router(recordings.router, prefix="/api/recordings", tags=["Recordings"], dependencies=service_deps)
+app.include_router(detection.router, prefix="/api/detections", tags=["Detection"], dependencies=service_deps)
 app.include_router(settings_router.router, prefix="/api/settings", tags=["Settings"])
-app.include_router(storage.router, prefix="/api/storage", tags=["Storage"])
+app.include_router(storage.router, prefix="/api/storage", tags=["Storage"], dependencies=service_deps)
 
 # Mount static files for frontend
 app.mount("/static", StaticFiles(directory="frontend"), name="static")
 
 # Mount HLS output directory
-app.mount("/hls", StaticFiles(directory=str(settings.data_dir / "hls")), name="hls")
+app.mount("/hls", StaticFiles(directory=str(config.settings.hls_output_dir)), name="hls")
 
 # Mount thumbnails directory
-app.mount("/thumbnails", StaticFiles(directory=str(settings.data_dir / "thumbnails")), name="thumbnails")
+app.mount("/thumbnails", StaticFiles(directory=str(config.settings.data_dir / "thumbnails")), name="thumbnails")
 
 
 @app.get("/")
@@ -184,7 +236,7 @@ async def websocket_endpoint(websocket: WebSocket):
             data = await websocket.receive_text()
             # Echo back or handle commands
             if data == "ping":
-                await websocket.send_text('{"type": "pong"}')
+                await websocket.send_bytes(_PONG)
     except WebSocketDisconnect:
         await ws_manager.disconnect(websocket)
 
@@ -194,6 +246,7 @@ async def health_check():
     """Health check endpoint."""
     return {
         "status": "healthy",
+        "ready": app.state.ready,
         "services": {
             "recorder": recorder.is_running if recorder else False,
             "hls_streamer": hls_streamer.is_running if hls_streamer else False,
@@ -202,11 +255,26 @@ async def health_check():
     }
 
 
+@app.get("/api/health/ready")
+async def readiness_check():
+    """Readiness probe - 503 until all services are initialized."""
+    if app.state.init_error:
+        return ORJSONResponse(status_code=503, content={"ready": False, "error": app.state.init_error})
+    if not app.state.ready:
+        return ORJSONResponse(status_code=503, content={"ready": False})
+    return {"ready": True}
+
+
 if __name__ == "__main__":
+    from importlib.util import find_spec
+
     import uvicorn
     uvicorn.run(
         "backend.main:app",
-        host=settings.host,
-        port=settings.port,
-        reload=False
+        host=config.settings.host,
+        port=config.settings.port,
+        reload=False,
+        loop="uvloop" if find_spec("uvloop") else "asyncio",
+        http="httptools" if find_spec("httptools") else "h11",
+        ws="websockets"
     )
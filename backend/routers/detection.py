@@ -1,19 +1,41 @@
+import asyncio
 import logging
-from datetime import datetime, timedelta
-from typing import Optional
+from datetime import datetime
+from typing import Literal, Optional
 
-from fastapi import APIRouter, Request, Query
+import numpy as np
+from fastapi import APIRouter, Depends, Query, Request, Response
+
+from backend.deps import get_detector, get_event_store
+from backend.etag import make_etag, not_modified
+from backend.services.event_store import EventStore
+from backend.services.person_detector import PersonDetector
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+GraphRange = Literal["10m", "30m", "1h", "6h", "12h", "24h", "48h"]
+
+# Graph range to minutes
+RANGE_MINUTES = {
+    "10m": 10,
+    "30m": 30,
+    "1h": 60,
+    "6h": 360,
+    "12h": 720,
+    "24h": 1440,
+    "48h": 2880
+}
+
 
 @router.get("/events")
 async def get_detection_events(
-    request: Request,
+    event_store: EventStore = Depends(get_event_store),
     start: Optional[str] = None,
     end: Optional[str] = None,
-    limit: int = Query(default=100, le=1000)
+    limit: int = Query(default=100, le=1000),
+    before_ts: Optional[int] = None,
+    before_id: Optional[int] = None
 ):
     """
     Get detection events within a time range.
@@ -22,28 +44,34 @@ async def get_detection_events(
         start: Start time in ISO format
         end: End time in ISO format
         limit: Maximum number of events to return
+        before_ts: Pagination cursor timestamp (epoch ms) from next_cursor
+        before_id: Pagination cursor event ID from next_cursor
     """
-    event_store = request.app.state.event_store
-
     start_time = datetime.fromisoformat(start) if start else None
     end_time = datetime.fromisoformat(end) if end else None
 
+    before = (before_ts, before_id) if before_ts is not None and before_id is not None else None
+
     events = await event_store.get_events(
         start_time=start_time,
         end_time=end_time,
-        limit=limit
+        limit=limit,
+        before=before
     )
 
     return {
         "events": events,
-        "total": len(events)
+        "total": len(events),
+        "next_cursor": event_store.cursor_for(events[-1]) if len(events) == limit else None
     }
 
 
 @router.get("/recent")
-async def get_recent_events(request: Request, limit: int = Query(default=10, le=50)):
+async def get_recent_events(
+    event_store: EventStore = Depends(get_event_store),
+    limit: int = Query(default=10, le=50)
+):
     """Get the most recent detection events."""
-    event_store = request.app.state.event_store
     events = await event_store.get_recent_events(limit=limit)
 
     return {
@@ -55,7 +83,9 @@ async def get_recent_events(request: Request, limit: int = Query(default=10, le=
 @router.get("/graph")
 async def get_graph_data(
     request: Request,
-    range: str = Query(default="1h", regex="^(10m|30m|1h|6h|12h|24h|48h)$")
+    response: Response,
+    event_store: EventStore = Depends(get_event_store),
+    range: GraphRange = "1h"
 ):
     """
     Get detection data for timeline graph.
@@ -63,19 +93,15 @@ async def get_graph_data(
     Args:
         range: Time range - 10m, 30m, 1h, 6h, 12h, 24h, or 48h
     """
-    event_store = request.app.state.event_store
-
-    # Convert range to minutes
-    range_map = {
-        "10m": 10,
-        "30m": 30,
-        "1h": 60,
-        "6h": 360,
-        "12h": 720,
-        "24h": 1440,
-        "48h": 2880
-    }
-    range_minutes = range_map.get(range, 60)
+    # Range is validated against GraphRange, so it is always a key
+    range_minutes = RANGE_MINUTES[range]
+
+    # The filled timeline shifts every minute, so the minute is part of the ETag
+    etag = make_etag(range, event_store.revision, datetime.now().strftime("%Y%m%d%H%M"))
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    response.headers["ETag"] = etag
 
     data = await event_store.get_graph_data(range_minutes=range_minutes)
 
@@ -90,13 +116,12 @@ async def get_graph_data(
 
 
 @router.get("/stats")
-async def get_detection_stats(request: Request):
+async def get_detection_stats(event_store: EventStore = Depends(get_event_store)):
     """Get detection statistics."""
-    event_store = request.app.state.event_store
-
-    count_1h = await event_store.get_event_count(hours=1)
-    count_24h = await event_store.get_event_count(hours=24)
-    recent = await event_store.get_recent_events(limit=1)
+    (count_1h, count_24h), recent = await asyncio.gather(
+        event_store.get_event_counts(hours=[1, 24]),
+        event_store.get_recent_events(limit=1)
+    )
 
     last_detection = None
     if recent:
@@ -110,38 +135,36 @@ async def get_detection_stats(request: Request):
 
 
 @router.get("/status")
-async def get_detector_status(request: Request):
+async def get_detector_status(detector: PersonDetector = Depends(get_detector)):
     """Get the current status of the person detector."""
-    detector = request.app.state.detector
-
     return {
         "running": detector.is_running,
-        "threshold": request.app.state.detector.event_store is not None
+        "threshold": detector.event_store is not None
     }
 
 
 def _fill_timeline_gaps(data: list, range_minutes: int) -> list:
     """Fill gaps in timeline data with zero values."""
-    # Create a map of existing data points
-    data_map = {item["minute"]: item for item in data} if data else {}
-
-    # Generate all minutes in range
-    now = datetime.now()
-    start_time = now - timedelta(minutes=range_minutes)
-
-    filled = []
-    current = start_time.replace(second=0, microsecond=0)
-
-    while current <= now:
-        minute_str = current.strftime("%Y-%m-%dT%H:%M:00")
-        if minute_str in data_map:
-            filled.append(data_map[minute_str])
-        else:
-            filled.append({
-                "minute": minute_str,
-                "max_confidence": 0,
-                "count": 0
-            })
-        current += timedelta(minutes=1)
-
-    return filled
+    end = np.datetime64(datetime.now(), "m")
+    start = end - range_minutes
+    count = range_minutes + 1
+
+    # Place existing data points by minute offset instead of string matching
+    by_offset = {}
+    if data:
+        offsets = np.array([item["minute"] for item in data], dtype="datetime64[m]") - start
+        by_offset = {
+            offset: item
+            for offset, item in zip(offsets.astype(np.int64).tolist(), data)
+            if 0 <= offset < count
+        }
+
+    # Only the missing minutes need formatting, as one vectorized batch
+    present = np.zeros(count, dtype=bool)
+    present[list(by_offset)] = True
+    gaps = iter(np.datetime_as_string(start + np.flatnonzero(~present), unit="s").tolist())
+
+    return [
+        by_offset.get(offset) or {"minute": next(gaps), "max_confidence": 0, "count": 0}
+        for offset in range(count)
+    ]
@@ -2,23 +2,49 @@ import logging
 from pathlib import Path
 from typing import Optional
 
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from fastapi.responses import FileResponse
 
+from backend.deps import get_recorder
+from backend.etag import make_etag, not_modified
+from backend.services.rtsp_recorder import RTSPRecorder
+
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
 @router.get("")
-async def list_recordings(request: Request, date: Optional[str] = None):
+async def list_recordings(
+    request: Request,
+    response: Response,
+    date: Optional[str] = None,
+    limit: Optional[int] = None,
+    offset: int = 0,
+    recorder: RTSPRecorder = Depends(get_recorder)
+):
     """
     List all recordings, optionally filtered by date.
 
     Args:
         date: Filter by date in YYYY-MM-DD format
+        limit: Return at most this many recordings (newest first)
+        offset: Skip this many recordings before the first one returned
     """
-    recorder = request.app.state.recorder
-    recordings = recorder.get_recordings(date)
+    recordings = recorder.get_recordings(date, limit=limit, offset=offset)
+
+    # Count, newest segment and total size change whenever the listing does
+    etag = make_etag(
+        date,
+        limit,
+        offset,
+        len(recordings),
+        recordings[0]["path"] if recordings else "",
+        sum(r["size_mb"] for r in recordings)
+    )
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    response.headers["ETag"] = etag
 
     # Get unique dates for navigation
     dates = sorted(set(r["date"] for r in recordings), reverse=True)
@@ -31,7 +57,11 @@ async def list_recordings(request: Request, date: Optional[str] = None):
 
 
 @router.get("/file/{date}/{filename}")
-async def stream_recording(request: Request, date: str, filename: str):
+async def stream_recording(
+    date: str,
+    filename: str,
+    recorder: RTSPRecorder = Depends(get_recorder)
+):
     """
     Stream a recording file.
 
@@ -39,16 +69,19 @@ async def stream_recording(request: Request, date: str, filename: str):
         date: Date in YYYY-MM-DD format
         filename: Recording filename (e.g., 20240115_120000.mp4)
     """
-    recorder = request.app.state.recorder
-    file_path = recorder.get_recording_path(date, filename)
+    recording = recorder.get_recording_file(date, filename)
 
-    if not file_path:
+    if not recording:
         raise HTTPException(status_code=404, detail="Recording not found")
 
+    file_path, file_stat = recording
+
+    # Pass the stat result through so FileResponse doesn't stat the file again
     return FileResponse(
         file_path,
         media_type="video/mp4",
         filename=filename,
+        stat_result=file_stat,
         headers={
             "Accept-Ranges": "bytes",
             "Cache-Control": "no-cache"
@@ -57,7 +90,11 @@ async def stream_recording(request: Request, date: str, filename: str):
 
 
 @router.delete("/file/{date}/{filename}")
-async def delete_recording(request: Request, date: str, filename: str):
+async def delete_recording(
+    date: str,
+    filename: str,
+    recorder: RTSPRecorder = Depends(get_recorder)
+):
     """
     Delete a recording file.
 
@@ -65,8 +102,6 @@ async def delete_recording(request: Request, date: str, filename: str):
         date: Date in YYYY-MM-DD format
         filename: Recording filename
     """
-    recorder = request.app.state.recorder
-
     if recorder.delete_recording(date, filename):
         logger.info(f"Deleted recording: {date}/{filename}")
         return {"status": "deleted", "file": f"{date}/{filename}"}
@@ -75,9 +110,8 @@ async def delete_recording(request: Request, date: str, filename: str):
 
 
 @router.get("/dates")
-async def list_dates(request: Request):
+async def list_dates(recorder: RTSPRecorder = Depends(get_recorder)):
     """List all dates with recordings."""
-    recorder = request.app.state.recorder
     recordings = recorder.get_recordings()
     dates = sorted(set(r["date"] for r in recordings), reverse=True)
 
@@ -1,16 +1,18 @@
 import logging
 from typing import Optional
 
-from fastapi import APIRouter, HTTPException, Request
-from pydantic import BaseModel
+import msgspec
+from fastapi import APIRouter, Depends, HTTPException, Request
 
-from backend.config import runtime_settings
+from backend import config
+from backend.deps import get_notification_service, require_ready
+from backend.services.notification import NotificationService
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
-class SettingsUpdate(BaseModel):
+class SettingsUpdate(msgspec.Struct, omit_defaults=True):
     telegram_enabled: Optional[bool] = None
     telegram_screenshot: Optional[bool] = None
     telegram_gif: Optional[bool] = None
@@ -18,19 +20,32 @@ class SettingsUpdate(BaseModel):
     retention_hours: Optional[int] = None
     theme: Optional[str] = None
     notification_cooldown_seconds: Optional[int] = None
+    clip_scale: Optional[bool] = None
+
+
+async def parse_settings_update(request: Request) -> SettingsUpdate:
+    """Decode and validate the request body directly with msgspec."""
+    try:
+        return msgspec.json.decode(await request.body(), type=SettingsUpdate)
+    except msgspec.DecodeError as e:
+        raise HTTPException(status_code=422, detail=str(e))
 
 
 @router.get("")
 async def get_settings():
     """Get all settings."""
-    return runtime_settings.to_dict()
+    return config.runtime_settings.to_dict()
 
 
 @router.put("")
-async def update_settings(update: SettingsUpdate):
+async def update_settings(update: SettingsUpdate = Depends(parse_settings_update)):
     """Update settings."""
     try:
-        update_dict = update.model_dump(exclude_none=True)
+        update_dict = {
+            key: value
+            for key, value in msgspec.structs.asdict(update).items()
+            if value is not None
+        }
 
         # Validate values
         if "detection_threshold" in update_dict:
@@ -61,10 +76,10 @@ async def update_settings(update: SettingsUpdate):
                     detail="Notification cooldown must be between 0 and 3600 seconds"
                 )
 
-        runtime_settings.update(**update_dict)
+        config.runtime_settings.update(**update_dict)
         logger.info(f"Settings updated: {update_dict}")
 
-        return {"status": "updated", "settings": runtime_settings.to_dict()}
+        return {"status": "updated", "settings": config.runtime_settings.to_dict()}
 
     except HTTPException:
         raise
@@ -73,11 +88,11 @@ async def update_settings(update: SettingsUpdate):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/test-telegram")
-async def test_telegram(request: Request):
+@router.post("/test-telegram", dependencies=[Depends(require_ready)])
+async def test_telegram(
+    notification_service: NotificationService = Depends(get_notification_service)
+):
     """Send a test Telegram message."""
-    notification_service = request.app.state.notification_service
-
     try:
         success = await notification_service.send_test_message()
         if success:
@@ -96,23 +111,23 @@ async def test_telegram(request: Request):
 async def reload_settings():
     """Reload settings from file."""
     try:
-        runtime_settings._load()
-        return {"status": "reloaded", "settings": runtime_settings.to_dict()}
+        config.runtime_settings._load()
+        return {"status": "reloaded", "settings": config.runtime_settings.to_dict()}
     except Exception as e:
         logger.error(f"Failed to reload settings: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/test-gif")
-async def test_gif(request: Request):
+@router.post("/test-gif", dependencies=[Depends(require_ready)])
+async def test_gif(
+    notification_service: NotificationService = Depends(get_notification_service)
+):
     """Send a test GIF (records next 10 seconds from live stream) to Telegram.
 
     This endpoint returns immediately after starting the recording.
     The GIF will be sent to Telegram once recording completes (~15 seconds).
     """
     import asyncio
-    notification_service = request.app.state.notification_service
-
     try:
         # Run in background so API returns quickly
         asyncio.create_task(notification_service.send_test_gif())
@@ -1,30 +1,29 @@
 import logging
 
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Depends
+
+from backend.deps import get_storage_manager
+from backend.services.storage_manager import StorageManager
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
 @router.get("")
-async def get_storage_stats(request: Request):
+async def get_storage_stats(storage_manager: StorageManager = Depends(get_storage_manager)):
     """Get storage statistics."""
-    storage_manager = request.app.state.storage_manager
-
-    stats = storage_manager.get_storage_stats()
+    stats = await storage_manager.get_storage_stats()
     stats["recordings_count"] = storage_manager.get_recordings_count()
 
     return stats
 
 
 @router.post("/cleanup")
-async def trigger_cleanup(request: Request):
+async def trigger_cleanup(storage_manager: StorageManager = Depends(get_storage_manager)):
     """Manually trigger storage cleanup."""
-    storage_manager = request.app.state.storage_manager
-
     try:
         await storage_manager.cleanup_old_recordings()
-        stats = storage_manager.get_storage_stats()
+        stats = await storage_manager.get_storage_stats()
 
         logger.info("Manual cleanup triggered")
 
@@ -1,33 +1,35 @@
 import asyncio
 import logging
-import subprocess
-import json
 
-from fastapi import APIRouter, HTTPException, Request
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import Response
 
-from backend.config import settings, runtime_settings
+from backend import config
+from backend.deps import get_hls_streamer, get_recorder
+from backend.services.hls_streamer import HLSStreamer
+from backend.services.rtsp_recorder import RTSPRecorder
+from backend.services.stream_probe import probe_stream
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
 @router.get("/hls/stream.m3u8")
-async def get_hls_playlist(request: Request):
+async def get_hls_playlist(hls_streamer: HLSStreamer = Depends(get_hls_streamer)):
     """
     Get the HLS playlist file.
     Returns the m3u8 playlist for live streaming.
     """
-    hls_streamer = request.app.state.hls_streamer
+    playlist = hls_streamer.get_playlist_bytes()
 
-    if not hls_streamer.is_playlist_ready():
+    if playlist is None:
         raise HTTPException(
             status_code=503,
             detail="Stream not ready. Please wait a few seconds."
         )
 
-    return FileResponse(
-        hls_streamer.get_playlist_path(),
+    return Response(
+        content=playlist,
         media_type="application/vnd.apple.mpegurl",
         headers={
             "Cache-Control": "no-cache, no-store, must-revalidate",
@@ -38,11 +40,11 @@ async def get_hls_playlist(request: Request):
 
 
 @router.get("/status")
-async def get_stream_status(request: Request):
+async def get_stream_status(
+    hls_streamer: HLSStreamer = Depends(get_hls_streamer),
+    recorder: RTSPRecorder = Depends(get_recorder)
+):
     """Get the current status of the HLS stream."""
-    hls_streamer = request.app.state.hls_streamer
-    recorder = request.app.state.recorder
-
     return {
         "hls_streaming": hls_streamer.is_running,
         "hls_ready": hls_streamer.is_playlist_ready(),
@@ -52,11 +54,11 @@ async def get_stream_status(request: Request):
 
 
 @router.post("/restart")
-async def restart_streams(request: Request):
+async def restart_streams(
+    hls_streamer: HLSStreamer = Depends(get_hls_streamer),
+    recorder: RTSPRecorder = Depends(get_recorder)
+):
     """Restart all streaming services."""
-    hls_streamer = request.app.state.hls_streamer
-    recorder = request.app.state.recorder
-
     # Stop services
     await hls_streamer.stop()
     await recorder.stop()
@@ -70,62 +72,22 @@ async def restart_streams(request: Request):
     return {"status": "restarting", "message": "Streams are restarting"}
 
 
-def _probe_stream(rtsp_url: str) -> dict:
-    """Probe an RTSP stream using ffprobe to get resolution and bitrate."""
-    try:
-        cmd = [
-            "ffprobe",
-            "-v", "quiet",
-            "-rtsp_transport", "tcp",
-            "-print_format", "json",
-            "-show_streams",
-            "-analyzeduration", "2000000",
-            "-probesize", "2000000",
-            rtsp_url
-        ]
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
-        if result.returncode != 0:
-            return {"error": f"ffprobe failed: {result.stderr}"}
-
-        data = json.loads(result.stdout)
-        streams = data.get("streams", [])
-
-        video_stream = None
-        for s in streams:
-            if s.get("codec_type") == "video":
-                video_stream = s
-                break
-
-        if not video_stream:
-            return {"error": "No video stream found"}
-
-        return {
-            "width": video_stream.get("width", 0),
-            "height": video_stream.get("height", 0),
-            "codec": video_stream.get("codec_name", "unknown"),
-            "fps": video_stream.get("r_frame_rate", "unknown"),
-            "bit_rate": int(video_stream.get("bit_rate", 0)) if video_stream.get("bit_rate") else 0,
-        }
-    except subprocess.TimeoutExpired:
-        return {"error": "Probe timeout"}
-    except Exception as e:
-        return {"error": str(e)}
-
-
 @router.post("/switch/{stream_type}")
-async def switch_stream(stream_type: int, request: Request):
+async def switch_stream(
+    stream_type: int,
+    hls_streamer: HLSStreamer = Depends(get_hls_streamer)
+):
     """Switch to a different stream type (0=high, 1=low) and restart HLS streamer."""
     if stream_type not in [0, 1]:
         raise HTTPException(status_code=400, detail="stream_type must be 0 or 1")
 
     # Update runtime settings
-    runtime_settings.update(stream_type=stream_type)
+    config.runtime_settings.update(stream_type=stream_type)
 
     # Get the RTSP URL for the new stream type
-    new_url = settings.rtsp_url_high if stream_type == 0 else settings.rtsp_url_low
+    new_url = config.settings.rtsp_url_high if stream_type == 0 else config.settings.rtsp_url_low
 
     # Stop HLS streamer
-    hls_streamer = request.app.state.hls_streamer
     await hls_streamer.stop()
 
     # Update RTSP URL and restart
@@ -142,28 +104,28 @@ async def switch_stream(stream_type: int, request: Request):
 
 
 @router.get("/compare")
-async def compare_streams():
-    """Probe both stream types and return their properties for comparison."""
-    # Run probes in parallel using threads (ffprobe is blocking)
-    import concurrent.futures
-
-    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
-        future_high = executor.submit(_probe_stream, settings.rtsp_url_high)
-        future_low = executor.submit(_probe_stream, settings.rtsp_url_low)
+async def compare_streams(fresh: bool = False):
+    """Probe both stream types and return their properties for comparison.
 
-        result_high = future_high.result()
-        result_low = future_low.result()
+    Args:
+        fresh: Bypass cached probe results and re-run ffprobe
+    """
+    # Run both probes concurrently as async subprocesses
+    result_high, result_low = await asyncio.gather(
+        probe_stream(config.settings.rtsp_url_high, fresh),
+        probe_stream(config.settings.rtsp_url_low, fresh)
+    )
 
     return {
         "stream_0": {
-            "url": settings.rtsp_url_high,
+            "url": config.settings.rtsp_url_high,
             "label": "High",
             **result_high
         },
         "stream_1": {
-            "url": settings.rtsp_url_low,
+            "url": config.settings.rtsp_url_low,
             "label": "Low",
             **result_low
         },
-        "current": runtime_settings.stream_type
+        "current": config.runtime_settings.stream_type
     }
@@ -1,47 +1,180 @@
 import asyncio
+import itertools
 import logging
+import time
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 import aiosqlite
 
 logger = logging.getLogger(__name__)
 
+# Timestamps are stored as INTEGER Unix epoch milliseconds
+CREATE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS detection_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp INTEGER NOT NULL,
+        confidence REAL NOT NULL,
+        thumbnail_path TEXT,
+        analysis TEXT,
+        analysis_confidence REAL,
+        analysis_model TEXT,
+        analysis_importance INTEGER,
+        analysis_send_gif INTEGER,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+INSERT_EVENT_SQL = """
+    INSERT INTO detection_events (
+        timestamp,
+        confidence,
+        thumbnail_path,
+        analysis,
+        analysis_confidence,
+        analysis_model,
+        analysis_importance,
+        analysis_send_gif
+    )
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+CREATE_META_SQL = """
+    CREATE TABLE IF NOT EXISTS _meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    )
+"""
+
+# Bump whenever _migrate_schema gains a step
+SCHEMA_VERSION = 2
+
+
+MINUTE_MS = 60000
+
+# Widest graph range served from the per-minute bucket cache (48h)
+GRAPH_CACHE_MINUTES = 2880
+
+
+def _to_ms(value: datetime) -> int:
+    """Convert a (naive, local) datetime to epoch milliseconds."""
+    return round(value.timestamp() * 1000)
+
+
+def _row_to_event(row: aiosqlite.Row) -> dict:
+    """Convert a database row to an event dict with an ISO timestamp.
+
+    The stored epoch milliseconds are kept as timestamp_ms, since the local ISO
+    time is ambiguous during the DST fall-back hour.
+    """
+    event = dict(row)
+    event["timestamp_ms"] = event["timestamp"]
+    event["timestamp"] = datetime.fromtimestamp(event["timestamp"] / 1000).isoformat()
+    return event
+
 
 class EventStore:
     """SQLite storage for detection events."""
 
+    # Write coalescing: inserts are committed in batches by a single writer task
+    FLUSH_INTERVAL = 0.05  # seconds to wait for more inserts before committing
+    MAX_BATCH = 64
+
+    # Extra read-only connections; WAL lets them read while the writer commits
+    READ_CONNECTIONS = 2
+
+    # Rows converted per fetchmany() round-trip on read paths
+    FETCH_CHUNK = 250
+
+    # Rows removed per DELETE transaction during cleanup
+    CLEANUP_BATCH = 1000
+
+    # Seconds between forced WAL truncations
+    CHECKPOINT_INTERVAL = 300
+
     def __init__(self, db_path: Path):
         self.db_path = db_path
         self._db: Optional[aiosqlite.Connection] = None
+        self._readers: List[aiosqlite.Connection] = []
+        self._reader_cycle = None
+        # Serializes writes only; reads go through the read-only connections
         self._lock = asyncio.Lock()
+        # Per-minute graph buckets keyed by minute epoch ms
+        self._graph_lock = asyncio.Lock()
+        self._graph_buckets: dict = {}
+        self._graph_start: Optional[int] = None
+        # Highest row ID folded into the buckets; single-writer IDs only grow
+        self._graph_last_id: int = 0
+        self._write_queue: asyncio.Queue = asyncio.Queue()
+        self._writer_task: Optional[asyncio.Task] = None
+        self._checkpoint_task: Optional[asyncio.Task] = None
+        # Bumped on every write so readers can detect changes without querying
+        self._revision_epoch = time.time_ns()
+        self._revision = 0
+
+    @property
+    def revision(self) -> str:
+        """Opaque marker that changes whenever stored events change."""
+        return f"{self._revision_epoch}-{self._revision}"
 
     async def initialize(self):
-        """Initialize database and create tables."""
+        """Initialize database and create tables.
+
+        Opens the long-lived connections used for the life of the process;
+        calling it again is a no-op rather than a reconnect.
+        """
+        if self._db is not None:
+            logger.warning("Event store already initialized")
+            return
+
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
         self._db = await aiosqlite.connect(str(self.db_path))
         self._db.row_factory = aiosqlite.Row
 
-        await self._db.execute("""
-            CREATE TABLE IF NOT EXISTS detection_events (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT NOT NULL,
-                confidence REAL NOT NULL,
-                thumbnail_path TEXT,
-                analysis TEXT,
-                analysis_confidence REAL,
-                analysis_model TEXT,
-                analysis_importance INTEGER,
-                analysis_send_gif INTEGER,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
+        # WAL lets dashboard reads proceed alongside detection writes;
+        # NORMAL sync is durable across app crashes in WAL mode
+        await self._db.execute("PRAGMA journal_mode=WAL")
+        await self._db.execute("PRAGMA synchronous=NORMAL")
+        await self._db.execute("PRAGMA temp_store=MEMORY")
+        await self._db.execute("PRAGMA cache_size=-64000")  # 64MB
+        await self._db.execute("PRAGMA mmap_size=268435456")  # 256MB
+        await self._db.execute("PRAGMA busy_timeout=5000")
+        await self._db.execute("PRAGMA wal_autocheckpoint=1000")
 
-        await self._db.execute("""
-            CREATE INDEX IF NOT EXISTS idx_timestamp ON detection_events(timestamp)
-        """)
+        await self._db.execute(CREATE_TABLE_SQL)
+        await self._db.execute(CREATE_META_SQL)
+
+        if await self._get_schema_version() != SCHEMA_VERSION:
+            await self._migrate_schema()
 
+        # Refresh planner statistics so SQLite picks the composite index
+        await self._db.execute("ANALYZE detection_events")
+
+        await self._db.commit()
+
+        for _ in range(self.READ_CONNECTIONS):
+            reader = await aiosqlite.connect(f"file:{self.db_path}?mode=ro", uri=True)
+            reader.row_factory = aiosqlite.Row
+            await reader.execute("PRAGMA mmap_size=268435456")
+            self._readers.append(reader)
+        self._reader_cycle = itertools.cycle(self._readers)
+
+        self._writer_task = asyncio.create_task(self._writer_loop())
+        self._checkpoint_task = asyncio.create_task(self._checkpoint_loop())
+        logger.info(f"Event store initialized at {self.db_path}")
+
+    async def _get_schema_version(self) -> Optional[int]:
+        cursor = await self._db.execute(
+            "SELECT value FROM _meta WHERE key = 'schema_version'"
+        )
+        row = await cursor.fetchone()
+        return int(row[0]) if row else None
+
+    async def _migrate_schema(self) -> None:
+        """Bring an older database up to SCHEMA_VERSION and record it."""
         await self._ensure_columns(
             [
                 "analysis",
@@ -51,9 +184,24 @@ class EventStore:
                 "analysis_send_gif"
             ]
         )
+        await self._migrate_timestamps()
 
-        await self._db.commit()
-        logger.info(f"Event store initialized at {self.db_path}")
+        # Composite index covers timestamp range scans and the confidence filter;
+        # it is a prefix superset of the old single-column index
+        await self._db.execute("""
+            CREATE INDEX IF NOT EXISTS idx_ts_conf ON detection_events(timestamp, confidence)
+        """)
+        await self._db.execute("DROP INDEX IF EXISTS idx_timestamp")
+        # Keyset pagination orders by (timestamp, id)
+        await self._db.execute("""
+            CREATE INDEX IF NOT EXISTS idx_ts_id ON detection_events(timestamp, id)
+        """)
+
+        await self._db.execute(
+            "INSERT OR REPLACE INTO _meta (key, value) VALUES ('schema_version', ?)",
+            (str(SCHEMA_VERSION),)
+        )
+        logger.info(f"Event store schema at version {SCHEMA_VERSION}")
 
     async def _ensure_columns(self, columns: List[str]) -> None:
         cursor = await self._db.execute("PRAGMA table_info(detection_events)")
@@ -73,8 +221,160 @@ class EventStore:
                 f"ALTER TABLE detection_events ADD COLUMN {column} {col_type}"
             )
 
+    async def _migrate_timestamps(self) -> None:
+        """Rebuild tables created with ISO TEXT timestamps to use epoch milliseconds.
+
+        The whole rebuild runs in one transaction. A detection_events_old table
+        left behind by an interrupted rebuild is copied back in on the next start.
+        """
+        cursor = await self._db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'detection_events_old'"
+        )
+        resume = await cursor.fetchone() is not None
+        if resume:
+            logger.warning("Resuming interrupted detection event timestamp migration")
+        else:
+            cursor = await self._db.execute("PRAGMA table_info(detection_events)")
+            rows = await cursor.fetchall()
+            types = {row[1]: row[2].upper() for row in rows}
+            if types.get("timestamp") != "TEXT":
+                return
+            logger.info("Migrating detection event timestamps to epoch milliseconds")
+
+        # sqlite3 runs DDL in autocommit mode unless a transaction is already open
+        if self._db.in_transaction:
+            await self._db.commit()
+        await self._db.execute("BEGIN")
+        try:
+            if not resume:
+                await self._db.execute("ALTER TABLE detection_events RENAME TO detection_events_old")
+                await self._db.execute(CREATE_TABLE_SQL)
+            # Copy whichever analysis columns the old table had gained
+            cursor = await self._db.execute("PRAGMA table_info(detection_events_old)")
+            columns = ", ".join(
+                row[1] for row in await cursor.fetchall() if row[1] not in ("id", "timestamp")
+            )
+            # ISO strings were written in local time; julianday(..., 'utc') converts to UTC.
+            # Events recorded since an interrupted run may hold old IDs; those old
+            # rows get new IDs, inserted after the ones that keep theirs
+            await self._db.execute(f"""
+                INSERT INTO detection_events (timestamp, id, {columns})
+                SELECT
+                    CAST(ROUND((julianday(timestamp, 'utc') - 2440587.5) * 86400000) AS INTEGER),
+                    CASE WHEN id IN (SELECT id FROM detection_events) THEN NULL ELSE id END,
+                    {columns}
+                FROM detection_events_old
+                ORDER BY id IN (SELECT id FROM detection_events), id
+            """)
+            await self._db.execute("DROP TABLE detection_events_old")
+            await self._db.commit()
+        except Exception:
+            await self._db.rollback()
+            raise
+
+    async def _fetch_events(self, cursor: aiosqlite.Cursor) -> List[dict]:
+        """Convert rows to event dicts in bounded chunks instead of one fetchall()."""
+        events = []
+        while rows := await cursor.fetchmany(self.FETCH_CHUNK):
+            events.extend(_row_to_event(row) for row in rows)
+        return events
+
+    def _reader(self) -> aiosqlite.Connection:
+        """Pick the next read-only connection, round-robin."""
+        return next(self._reader_cycle)
+
+    async def _writer_loop(self):
+        """Collect queued inserts and commit them in batches."""
+        loop = asyncio.get_running_loop()
+
+        while True:
+            item = await self._write_queue.get()
+            if item is None:
+                return
+
+            batch = [item]
+            stopping = False
+            deadline = loop.time() + self.FLUSH_INTERVAL
+            while len(batch) < self.MAX_BATCH:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._write_queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._flush_batch(batch)
+            if stopping:
+                return
+
+    async def _flush_batch(self, batch: list):
+        """Insert a batch of events in one transaction and resolve their row IDs."""
+        try:
+            async with self._lock:
+                try:
+                    await self._db.executemany(INSERT_EVENT_SQL, [row for row, _ in batch])
+                    cursor = await self._db.execute("SELECT last_insert_rowid()")
+                    (last_id,) = await cursor.fetchone()
+                    await self._db.commit()
+                except Exception:
+                    # Otherwise rows reported as failed would be committed with the next batch
+                    await self._db.rollback()
+                    raise
+                self._revision += 1
+        except Exception as e:
+            logger.error(f"Failed to write {len(batch)} detection events: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        # AUTOINCREMENT IDs are consecutive within the single-writer transaction
+        first_id = last_id - len(batch) + 1
+        for offset, (_, future) in enumerate(batch):
+            if not future.done():
+                future.set_result(first_id + offset)
+
+    async def _checkpoint_loop(self):
+        """Periodically truncate the WAL so detection bursts can't grow it unbounded."""
+        while True:
+            await asyncio.sleep(self.CHECKPOINT_INTERVAL)
+            try:
+                async with self._lock:
+                    await self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            except Exception as e:
+                logger.error(f"WAL checkpoint error: {e}")
+
     async def close(self):
-        """Close database connection."""
+        """Close database connections. Safe to call more than once."""
+        if self._checkpoint_task:
+            self._checkpoint_task.cancel()
+            try:
+                await self._checkpoint_task
+            except asyncio.CancelledError:
+                pass
+            self._checkpoint_task = None
+
+        if self._writer_task:
+            # Flush pending inserts before closing
+            await self._write_queue.put(None)
+            await self._writer_task
+            self._writer_task = None
+
+        # Inserts queued behind the stop marker will never be written
+        while not self._write_queue.empty():
+            item = self._write_queue.get_nowait()
+            if item is not None and not item[1].done():
+                item[1].set_exception(RuntimeError("Event store is closed"))
+
+        for reader in self._readers:
+            await reader.close()
+        self._readers = []
+
         if self._db:
             await self._db.close()
             self._db = None
@@ -90,86 +390,134 @@ class EventStore:
         analysis_importance: Optional[int] = None,
         analysis_send_gif: Optional[bool] = None
     ) -> int:
-        """Add a detection event."""
-        async with self._lock:
-            cursor = await self._db.execute(
-                """
-                INSERT INTO detection_events (
-                    timestamp,
-                    confidence,
-                    thumbnail_path,
-                    analysis,
-                    analysis_confidence,
-                    analysis_model,
-                    analysis_importance,
-                    analysis_send_gif
-                )
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    timestamp.isoformat(),
-                    confidence,
-                    thumbnail_path,
-                    analysis,
-                    analysis_confidence,
-                    analysis_model,
-                    analysis_importance,
-                    1 if analysis_send_gif else 0 if analysis_send_gif is not None else None
-                )
-            )
-            await self._db.commit()
-            return cursor.lastrowid
+        """Add a detection event. Returns the new row ID once its batch commits.
+
+        Raises RuntimeError if the store is not running.
+        """
+        if self._writer_task is None or self._writer_task.done():
+            raise RuntimeError("Event store is closed")
+
+        row = (
+            _to_ms(timestamp),
+            confidence,
+            thumbnail_path,
+            analysis,
+            analysis_confidence,
+            analysis_model,
+            analysis_importance,
+            1 if analysis_send_gif else 0 if analysis_send_gif is not None else None
+        )
+        future = asyncio.get_running_loop().create_future()
+        await self._write_queue.put((row, future))
+        return await future
 
     async def get_events(
         self,
         start_time: Optional[datetime] = None,
         end_time: Optional[datetime] = None,
-        limit: int = 100
+        limit: int = 100,
+        before: Optional[Tuple[int, int]] = None
     ) -> List[dict]:
-        """Get detection events within a time range."""
+        """Get detection events within a time range, newest first.
+
+        Args:
+            before: Keyset cursor (timestamp_ms, id); only older events are returned
+        """
         query = "SELECT * FROM detection_events WHERE 1=1"
         params = []
 
         if start_time:
             query += " AND timestamp >= ?"
-            params.append(start_time.isoformat())
+            params.append(_to_ms(start_time))
 
         if end_time:
             query += " AND timestamp <= ?"
-            params.append(end_time.isoformat())
+            params.append(_to_ms(end_time))
+
+        if before:
+            query += " AND (timestamp, id) < (?, ?)"
+            params.extend(before)
 
-        query += " ORDER BY timestamp DESC LIMIT ?"
+        query += " ORDER BY timestamp DESC, id DESC LIMIT ?"
         params.append(limit)
 
-        async with self._lock:
-            cursor = await self._db.execute(query, params)
-            rows = await cursor.fetchall()
+        cursor = await self._reader().execute(query, params)
+        return await self._fetch_events(cursor)
 
-        return [dict(row) for row in rows]
+    @staticmethod
+    def cursor_for(event: dict) -> dict:
+        """Keyset cursor that continues pagination after the given event."""
+        return {
+            "before_ts": event["timestamp_ms"],
+            "before_id": event["id"]
+        }
 
     async def get_graph_data(self, range_minutes: int = 60) -> List[dict]:
         """
         Get detection data aggregated for graph display.
         Returns data points with timestamp and max confidence per minute.
+
+        Minute buckets are cached; each call only folds in rows added since the
+        previous refresh, by row ID, so late-committed events are still counted.
         """
-        start_time = datetime.now() - timedelta(minutes=range_minutes)
+        now_ms = _to_ms(datetime.now())
+        start_minute = (now_ms - range_minutes * MINUTE_MS) // MINUTE_MS * MINUTE_MS
 
-        query = """
+        aggregate = """
             SELECT
-                strftime('%Y-%m-%dT%H:%M:00', timestamp) as minute,
+                (timestamp / 60000) * 60000 as minute,
                 MAX(confidence) as max_confidence,
                 COUNT(*) as count
             FROM detection_events
-            WHERE timestamp >= ?
+            WHERE {where}
             GROUP BY minute
-            ORDER BY minute ASC
         """
+        # Cold: range scan on the timestamp index
+        cold_query = aggregate.format(where="timestamp >= ? AND id <= ?")
+        # Incremental: rowid range; the unary + keeps SQLite off the timestamp index
+        refresh_query = aggregate.format(where="id > ? AND id <= ? AND +timestamp >= ?")
+
+        async with self._graph_lock:
+            reader = self._reader()
+            cursor = await reader.execute("SELECT COALESCE(MAX(id), 0) FROM detection_events")
+            (last_id,) = await cursor.fetchone()
+
+            if self._graph_start is None or start_minute < self._graph_start:
+                # Cold cache or a wider range than cached: aggregate everything
+                self._graph_buckets = {}
+                self._graph_start = start_minute
+                cursor = await reader.execute(cold_query, (start_minute, last_id))
+            else:
+                cursor = await reader.execute(
+                    refresh_query, (self._graph_last_id, last_id, self._graph_start)
+                )
 
-        async with self._lock:
-            cursor = await self._db.execute(query, (start_time.isoformat(),))
-            rows = await cursor.fetchall()
-
-        return [dict(row) for row in rows]
+            while rows := await cursor.fetchmany(self.FETCH_CHUNK):
+                for row in rows:
+                    bucket = self._graph_buckets.get(row["minute"])
+                    max_confidence, count = row["max_confidence"], row["count"]
+                    if bucket:
+                        max_confidence = max(max_confidence, bucket["max_confidence"])
+                        count += bucket["count"]
+                    # Replaced, not mutated: earlier callers may still hold the old dict
+                    self._graph_buckets[row["minute"]] = {
+                        "minute": datetime.fromtimestamp(row["minute"] / 1000).strftime("%Y-%m-%dT%H:%M:00"),
+                        "max_confidence": max_confidence,
+                        "count": count
+                    }
+            self._graph_last_id = last_id
+
+            # Bound the cache to the widest range the dashboard offers
+            horizon = (now_ms - GRAPH_CACHE_MINUTES * MINUTE_MS) // MINUTE_MS * MINUTE_MS
+            for minute in [m for m in self._graph_buckets if m < horizon]:
+                del self._graph_buckets[minute]
+            self._graph_start = max(self._graph_start, horizon)
+
+            return [
+                self._graph_buckets[minute]
+                for minute in sorted(self._graph_buckets)
+                if minute >= start_minute
+            ]
 
     async def get_recent_events(self, limit: int = 10) -> List[dict]:
         """Get most recent detection events."""
@@ -179,38 +527,71 @@ class EventStore:
             LIMIT ?
         """
 
-        async with self._lock:
-            cursor = await self._db.execute(query, (limit,))
-            rows = await cursor.fetchall()
-
-        return [dict(row) for row in rows]
+        cursor = await self._reader().execute(query, (limit,))
+        return await self._fetch_events(cursor)
 
     async def get_event_count(self, hours: int = 24) -> int:
         """Get total event count in the last N hours."""
         start_time = datetime.now() - timedelta(hours=hours)
 
-        async with self._lock:
-            cursor = await self._db.execute(
-                "SELECT COUNT(*) FROM detection_events WHERE timestamp >= ? AND confidence > 0",
-                (start_time.isoformat(),)
-            )
-            row = await cursor.fetchone()
+        cursor = await self._reader().execute(
+            "SELECT COUNT(*) FROM detection_events WHERE timestamp >= ? AND confidence > 0",
+            (_to_ms(start_time),)
+        )
+        row = await cursor.fetchone()
 
         return row[0] if row else 0
 
+    async def get_event_counts(self, hours: List[int]) -> List[int]:
+        """Get event counts for several trailing windows in a single query."""
+        now = datetime.now()
+        cutoffs = [_to_ms(now - timedelta(hours=h)) for h in hours]
+        columns = ", ".join(
+            "COALESCE(SUM(CASE WHEN timestamp >= ? THEN 1 ELSE 0 END), 0)" for _ in cutoffs
+        )
+
+        cursor = await self._reader().execute(
+            f"SELECT {columns} FROM detection_events WHERE timestamp >= ? AND confidence > 0",
+            (*cutoffs, min(cutoffs))
+        )
+        row = await cursor.fetchone()
+
+        return list(row) if row else [0] * len(hours)
+
     async def cleanup_old_events(self, retention_hours: int = 48):
-        """Delete events older than retention period."""
-        cutoff_time = datetime.now() - timedelta(hours=retention_hours)
+        """Delete events older than retention period.
 
-        async with self._lock:
-            cursor = await self._db.execute(
-                "DELETE FROM detection_events WHERE timestamp < ?",
-                (cutoff_time.isoformat(),)
-            )
-            await self._db.commit()
-            deleted = cursor.rowcount
+        Deletes in bounded batches, releasing the write lock in between so
+        detection inserts are not held up, then truncates the WAL so the
+        freed pages do not linger on disk.
+        """
+        cutoff_ms = _to_ms(datetime.now() - timedelta(hours=retention_hours))
+        deleted = 0
+
+        while True:
+            async with self._lock:
+                cursor = await self._db.execute(
+                    """
+                    DELETE FROM detection_events WHERE id IN (
+                        SELECT id FROM detection_events WHERE timestamp < ? LIMIT ?
+                    )
+                    """,
+                    (cutoff_ms, self.CLEANUP_BATCH)
+                )
+                await self._db.commit()
+            deleted += cursor.rowcount
+            if cursor.rowcount < self.CLEANUP_BATCH:
+                break
 
         if deleted > 0:
+            self._revision += 1
+            # Deleted rows may fall inside cached graph buckets; invalidate under
+            # the graph lock so a concurrent get_graph_data never sees a half reset
+            async with self._graph_lock:
+                self._graph_buckets = {}
+                self._graph_start = None
+            async with self._lock:
+                await self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
             logger.info(f"Cleaned up {deleted} old detection events")
 
         return deleted
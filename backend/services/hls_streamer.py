@@ -1,13 +1,39 @@
 import asyncio
 import logging
-import subprocess
+import os
+import re
+from collections import deque
 from pathlib import Path
 from typing import Optional
 
+from backend.services.hw_encoder import FFMPEG, SOFTWARE_ENCODER, detect_h264_encoder, input_args, video_args
+from backend.services.stream_probe import probe_stream
 from backend.websocket.manager import ConnectionManager
 
 logger = logging.getLogger(__name__)
 
+RAM_FILESYSTEMS = ("tmpfs", "ramfs")
+
+# FFmpeg ends progress lines with \r and log lines with \n
+LINE_END_RE = re.compile(rb"[\r\n]")
+
+
+def _is_ram_backed(path: Path) -> bool:
+    """Check /proc/mounts for whether path lives on a RAM filesystem."""
+    try:
+        with open("/proc/mounts") as f:
+            mounts = [line.split()[1:3] for line in f]
+    except OSError:
+        return False
+
+    resolved = str(path.resolve())
+    best, best_type = "", None
+    for mount_point, fs_type in mounts:
+        prefix = mount_point.rstrip("/") + "/"
+        if (resolved == mount_point or resolved.startswith(prefix)) and len(mount_point) > len(best):
+            best, best_type = mount_point, fs_type
+    return best_type in RAM_FILESYSTEMS
+
 
 class HLSStreamer:
     """Converts RTSP stream to HLS for web playback."""
@@ -25,13 +51,27 @@ class HLSStreamer:
         self.ws_manager = ws_manager
         self.segment_duration = segment_duration
         self.playlist_size = playlist_size
-        self._process: Optional[subprocess.Popen] = None
+        self._process: Optional[asyncio.subprocess.Process] = None
         self._running = False
         self._task: Optional[asyncio.Task] = None
+        self._playlist_bytes: Optional[bytes] = None
+        self._playlist_mtime: Optional[int] = None
+        # Last FFmpeg stderr lines, kept for error logging
+        self._stderr_tail: deque = deque(maxlen=50)
+        # Stream-copy video when the camera already sends H.264
+        self._copy_video = False
+        # H.264 encoder used when re-encoding; probed on start
+        self._encoder = SOFTWARE_ENCODER
+
+        if not _is_ram_backed(output_dir):
+            logger.warning(
+                f"HLS output {output_dir} is not on tmpfs; segment writes will hit disk. "
+                f"Set HLS_DIR to a tmpfs path such as /dev/shm/hls"
+            )
 
     @property
     def is_running(self) -> bool:
-        return self._running and self._process is not None and self._process.poll() is None
+        return self._running and self._process is not None and self._process.returncode is None
 
     async def start(self):
         """Start the HLS streaming process."""
@@ -40,7 +80,15 @@ class HLSStreamer:
             return
 
         # Clean old HLS files
-        self._cleanup_old_segments()
+        await asyncio.to_thread(self._cleanup_old_segments)
+
+        probe = await probe_stream(self.rtsp_url)
+        self._copy_video = probe.get("codec") == "h264"
+        if self._copy_video:
+            logger.info("Source is H.264, HLS will stream-copy video")
+        else:
+            self._encoder = await detect_h264_encoder()
+            logger.info(f"Source codec {probe.get('codec', 'unknown')}, HLS will re-encode with {self._encoder}")
 
         self._running = True
         self._task = asyncio.create_task(self._streaming_loop())
@@ -50,13 +98,14 @@ class HLSStreamer:
     async def stop(self):
         """Stop the HLS streaming process."""
         self._running = False
-        if self._process:
+        if self._process and self._process.returncode is None:
             self._process.terminate()
             try:
-                self._process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
+                await asyncio.wait_for(self._process.wait(), timeout=5)
+            except asyncio.TimeoutError:
                 self._process.kill()
-            self._process = None
+                await self._process.wait()
+        self._process = None
 
         if self._task:
             self._task.cancel()
@@ -65,16 +114,28 @@ class HLSStreamer:
             except asyncio.CancelledError:
                 pass
 
-        self._cleanup_old_segments()
+        await asyncio.to_thread(self._cleanup_old_segments)
         logger.info("HLS streamer stopped")
         await self.ws_manager.send_status_update("hls_streamer", "stopped", "Streaming stopped")
 
     def _cleanup_old_segments(self):
-        """Remove old HLS segments and playlist."""
-        for file in self.output_dir.glob("*.ts"):
-            file.unlink()
-        for file in self.output_dir.glob("*.m3u8"):
-            file.unlink()
+        """Remove old HLS segments and playlist in a single directory pass."""
+        with os.scandir(self.output_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith((".ts", ".m3u8")):
+                    try:
+                        os.unlink(entry.path)
+                    except FileNotFoundError:
+                        pass
+
+    def _build_video_args(self) -> list:
+        """Video codec arguments: copy H.264 as-is, otherwise re-encode."""
+        if self._copy_video:
+            # GOP is whatever the camera sends; segments cut on its keyframes
+            return ["-c:v", "copy", "-bsf:v", "h264_mp4toannexb"]
+
+        # Re-encode for HLS compatibility; GOP size = segment * fps
+        return video_args(self._encoder, self.segment_duration * 25)
 
     def _build_ffmpeg_command(self) -> list:
         """Build FFmpeg command for HLS streaming."""
@@ -82,22 +143,22 @@ class HLSStreamer:
         segment_path = self.output_dir / "segment%03d.ts"
 
         return [
-            "ffmpeg",
+            FFMPEG,
             "-y",
+            # stderr is only kept for the exit error log, so drop info chatter and progress
+            "-hide_banner",
+            "-loglevel", "warning",
+            "-nostats",
             "-rtsp_transport", "tcp",
             "-fflags", "+genpts+discardcorrupt",  # Generate timestamps, discard corrupt frames
             "-analyzeduration", "1000000",         # 1 second analyze duration
             "-probesize", "1000000",               # 1MB probe size
             "-max_delay", "500000",                # 500ms max delay
             "-reorder_queue_size", "500",          # Buffer for out-of-order packets
+            *([] if self._copy_video else input_args(self._encoder)),
             "-i", self.rtsp_url,
-            # Video encoding - re-encode for HLS compatibility
-            "-c:v", "libx264",
-            "-preset", "ultrafast",
-            "-tune", "zerolatency",
-            "-crf", "28",
-            "-g", str(self.segment_duration * 25),  # GOP size = segment * fps
-            "-sc_threshold", "0",
+            # Video
+            *self._build_video_args(),
             # Audio
             "-c:a", "aac",
             "-b:a", "128k",
@@ -120,21 +181,24 @@ class HLSStreamer:
                 cmd = self._build_ffmpeg_command()
                 logger.info(f"Starting FFmpeg HLS: {' '.join(cmd)}")
 
-                self._process = subprocess.Popen(
-                    cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE
+                self._stderr_tail.clear()
+                process = await asyncio.create_subprocess_exec(
+                    *cmd,
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.PIPE
                 )
+                self._process = process
+                drain_task = asyncio.create_task(self._drain_stderr(process.stderr))
 
                 await self.ws_manager.send_status_update("hls_streamer", "connected", "Live stream active")
 
-                # Monitor process
-                while self._running and self._process.poll() is None:
-                    await asyncio.sleep(1)
+                # Wait for exit; stderr is drained concurrently so FFmpeg never blocks on it
+                await process.wait()
+                await drain_task
 
-                if self._process.returncode is not None and self._process.returncode != 0:
-                    stderr = self._process.stderr.read().decode() if self._process.stderr else ""
-                    logger.error(f"FFmpeg HLS exited with code {self._process.returncode}: {stderr[-500:]}")
+                if self._running and process.returncode != 0:
+                    stderr = "\n".join(self._stderr_tail)
+                    logger.error(f"FFmpeg HLS exited with code {process.returncode}: {stderr[-500:]}")
 
             except Exception as e:
                 logger.error(f"HLS streaming error: {e}")
@@ -148,10 +212,34 @@ class HLSStreamer:
                 await asyncio.sleep(retry_delay)
                 retry_delay = min(retry_delay * 2, 60)
 
+    async def _drain_stderr(self, stream: asyncio.StreamReader):
+        """Continuously read FFmpeg stderr into a bounded tail buffer."""
+        # FFmpeg progress lines end in \r, so read chunks rather than readline()
+        pending = b""
+        while chunk := await stream.read(4096):
+            # Keep a partial last line for the next chunk
+            *lines, pending = LINE_END_RE.split(pending + chunk)
+            pending = pending[-4096:]
+            self._stderr_tail.extend(line.decode(errors="replace") for line in lines if line)
+        if pending:
+            self._stderr_tail.append(pending.decode(errors="replace"))
+
     def get_playlist_path(self) -> Path:
         """Get path to HLS playlist."""
         return self.output_dir / "stream.m3u8"
 
+    def get_playlist_bytes(self) -> Optional[bytes]:
+        """Get HLS playlist contents, re-reading only when the file changes."""
+        try:
+            mtime = os.stat(self.get_playlist_path()).st_mtime_ns
+            if mtime != self._playlist_mtime:
+                self._playlist_bytes = self.get_playlist_path().read_bytes()
+                self._playlist_mtime = mtime
+        except FileNotFoundError:
+            self._playlist_bytes = None
+            self._playlist_mtime = None
+        return self._playlist_bytes
+
     def is_playlist_ready(self) -> bool:
         """Check if HLS playlist is available."""
         return self.get_playlist_path().exists()
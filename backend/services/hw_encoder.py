@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import shutil
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Resolved once and used for every FFmpeg invocation; None if not on PATH
+FFMPEG_PATH = shutil.which("ffmpeg")
+FFMPEG = FFMPEG_PATH or "ffmpeg"
+
+# Hardware H.264 encoders in order of preference; libx264 is the fallback
+HW_ENCODERS = ("h264_nvenc", "h264_qsv", "h264_vaapi", "h264_v4l2m2m", "h264_videotoolbox")
+SOFTWARE_ENCODER = "libx264"
+VAAPI_DEVICE = "/dev/dri/renderD128"
+
+_detected_encoder: Optional[str] = None
+# Callers racing at startup (HLS, clips) wait for one probe instead of each running it
+_detect_lock = asyncio.Lock()
+
+
+def device_args(encoder: str) -> list:
+    """Global options an encoder needs before any input."""
+    if encoder == "h264_vaapi":
+        return ["-vaapi_device", VAAPI_DEVICE]
+    return []
+
+
+def input_args(encoder: str) -> list:
+    """Options placed before -i: hardware decode and device selection."""
+    if encoder == "h264_nvenc":
+        return ["-hwaccel", "cuda"]
+    return device_args(encoder)
+
+
+def video_args(
+    encoder: str,
+    gop: int,
+    width: Optional[int] = None,
+    bitrate: Optional[str] = None
+) -> list:
+    """Low-latency H.264 encode arguments for the given encoder.
+
+    width scales the output (keeping aspect ratio) and bitrate sets a target
+    rate for hardware encoders; libx264 always uses CRF. Output is always
+    4:2:0 so clips encoded from raw BGR frames stay playable on phones.
+    """
+    filters = [f"scale={width}:-2"] if width else []
+    rate = ["-b:v", bitrate] if bitrate else []
+
+    if encoder == "h264_nvenc":
+        codec = ["-c:v", "h264_nvenc", "-preset", "p1", "-tune", "ll", "-pix_fmt", "yuv420p", *rate]
+    elif encoder == "h264_qsv":
+        filters.append("format=nv12")
+        codec = ["-c:v", "h264_qsv", "-preset", "veryfast", *rate]
+    elif encoder == "h264_vaapi":
+        filters.append("format=nv12,hwupload")
+        codec = ["-c:v", "h264_vaapi", *rate]
+    elif encoder == "h264_v4l2m2m":
+        filters.append("format=yuv420p")
+        codec = ["-c:v", "h264_v4l2m2m", *rate]
+    elif encoder == "h264_videotoolbox":
+        codec = ["-c:v", "h264_videotoolbox", "-realtime", "1", "-pix_fmt", "yuv420p", *rate]
+    else:
+        codec = [
+            "-c:v", SOFTWARE_ENCODER,
+            "-preset", "ultrafast",
+            # zerolatency also enables sliced threads, which parallelize within a frame
+            "-tune", "zerolatency",
+            "-threads", "0",
+            "-crf", "28",
+            "-sc_threshold", "0",
+            "-pix_fmt", "yuv420p",
+        ]
+
+    vf = ["-vf", ",".join(filters)] if filters else []
+    return [*vf, *codec, "-g", f"{gop}"]
+
+
+async def _run_ffmpeg(*args: str) -> tuple[int, bytes]:
+    process = await asyncio.create_subprocess_exec(
+        FFMPEG, "-hide_banner", *args,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL
+    )
+    try:
+        stdout, _ = await asyncio.wait_for(process.communicate(), timeout=10)
+    except asyncio.TimeoutError:
+        try:
+            process.kill()
+        except ProcessLookupError:
+            pass  # Exited between the timeout and the kill
+        await process.wait()
+        return -1, b""
+    return process.returncode, stdout
+
+
+async def _encoder_works(encoder: str) -> bool:
+    """Listed encoders can still lack a device or driver; try a tiny encode."""
+    returncode, _ = await _run_ffmpeg(
+        "-loglevel", "error",
+        *device_args(encoder),
+        "-f", "lavfi", "-i", "color=size=256x256:duration=0.2",
+        *video_args(encoder, 10),
+        "-f", "null", "-"
+    )
+    return returncode == 0
+
+
+async def detect_h264_encoder() -> str:
+    """Pick the best working H.264 encoder on this host, probing only once."""
+    global _detected_encoder
+    if _detected_encoder is not None:
+        return _detected_encoder
+
+    async with _detect_lock:
+        if _detected_encoder is not None:
+            return _detected_encoder
+
+        encoder = SOFTWARE_ENCODER
+        try:
+            _, listing = await _run_ffmpeg("-encoders")
+            available = listing.decode(errors="replace")
+            for candidate in HW_ENCODERS:
+                if f" {candidate} " in available and await _encoder_works(candidate):
+                    encoder = candidate
+                    break
+        except Exception as e:
+            logger.warning(f"Hardware encoder probe failed: {e}")
+
+        logger.info(f"Using H.264 encoder: {encoder}")
+        _detected_encoder = encoder
+        return encoder
@@ -1,17 +1,18 @@
 import asyncio
-import io
 import logging
-import subprocess
 import tempfile
 from datetime import datetime
 from pathlib import Path
 from typing import Optional
 
 import cv2
+import httpx
 import numpy as np
-from PIL import Image
+import orjson
 
-from backend.config import runtime_settings
+from backend import config
+from backend.services.hw_encoder import FFMPEG, detect_h264_encoder, device_args, input_args, video_args
+from backend.services.jpeg_encoder import AdaptiveJpegEncoder
 
 logger = logging.getLogger(__name__)
 
@@ -19,17 +20,31 @@ logger = logging.getLogger(__name__)
 class NotificationService:
     """Telegram notification service for detection alerts."""
 
+    # Long-side cap for screenshots; Telegram resizes larger photos itself
+    SCREENSHOT_MAX_SIDE = 1280
+
+    # Alerts arriving within this many seconds are collapsed into one message
+    ALERT_BATCH_WINDOW = 2.0
+
+    # Seconds of buffered footage before the alert included in detection clips
+    CLIP_PRE_SECONDS = 5
+
     def __init__(self, bot_token: str, chat_id: str, data_dir: Path):
         self.bot_token = bot_token
         self.chat_id = chat_id
         self.data_dir = data_dir
-        self._bot = None
+        self._client: Optional[httpx.AsyncClient] = None
         self._initialized = False
+        self._pending_alert: Optional[dict] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._screenshot_encoder = AdaptiveJpegEncoder()
+        # Detector providing buffered frames for alert clips; set after construction
+        self.frame_source = None
 
     async def _ensure_bot(self):
         """Initialize Telegram bot lazily."""
         if self._initialized:
-            return self._bot is not None
+            return self._client is not None
 
         if not self.bot_token or self.bot_token == "your_bot_token":
             logger.warning("Telegram bot token not configured")
@@ -42,8 +57,14 @@ class NotificationService:
             return False
 
         try:
-            from telegram import Bot
-            self._bot = Bot(token=self.bot_token)
+            # One keep-alive client so alerts skip the TCP/TLS handshake
+            self._client = httpx.AsyncClient(
+                base_url=f"https://api.telegram.org/bot{self.bot_token}/",
+                http2=True,
+                # Clip uploads can take far longer than a text message
+                timeout=httpx.Timeout(10, read=60, write=120),
+                limits=httpx.Limits(max_connections=8, max_keepalive_connections=4)
+            )
             self._initialized = True
             logger.info("Telegram bot initialized")
             return True
@@ -52,6 +73,46 @@ class NotificationService:
             self._initialized = True
             return False
 
+    async def _call(self, method: str, data: dict, files: Optional[dict] = None) -> dict:
+        """Call a Telegram Bot API method, raising on an error response."""
+        response = await self._client.post(method, data=data, files=files)
+        result = response.json()
+        if not result.get("ok"):
+            raise RuntimeError(f"Telegram {method} failed: {result.get('description', response.status_code)}")
+        return result["result"]
+
+    async def _send_message(self, text: str):
+        await self._call("sendMessage", {"chat_id": self.chat_id, "text": text})
+
+    async def _send_photo(self, photo: bytes, caption: str):
+        await self._call(
+            "sendPhoto",
+            {"chat_id": self.chat_id, "caption": caption},
+            files={"photo": ("screenshot.jpg", photo, "image/jpeg")}
+        )
+
+    async def _send_media_group(self, photo: bytes, caption: str, video: bytes):
+        """Send a photo and a video as one album; the caption shows under the album."""
+        media = [
+            {"type": "photo", "media": "attach://photo", "caption": caption},
+            {"type": "video", "media": "attach://video", "supports_streaming": True},
+        ]
+        await self._call(
+            "sendMediaGroup",
+            {"chat_id": self.chat_id, "media": orjson.dumps(media).decode()},
+            files={
+                "photo": ("screenshot.jpg", photo, "image/jpeg"),
+                "video": ("clip.mp4", video, "video/mp4"),
+            }
+        )
+
+    async def _send_video(self, video: bytes, caption: str):
+        await self._call(
+            "sendVideo",
+            {"chat_id": self.chat_id, "caption": caption, "supports_streaming": "true"},
+            files={"video": ("clip.mp4", video, "video/mp4")}
+        )
+
     async def send_detection_alert(
         self,
         frame: np.ndarray,
@@ -61,30 +122,89 @@ class NotificationService:
         analysis_confidence: Optional[float] = None,
         send_gif: bool = False
     ):
-        """Send detection alert with screenshot and optional GIF."""
-        if not runtime_settings.telegram_enabled:
+        """Queue a detection alert; alerts within ALERT_BATCH_WINDOW are sent once.
+
+        The highest-confidence frame of the window is the one delivered, and a
+        clip is recorded if any alert in the window asked for one.
+        """
+        if not config.runtime_settings.telegram_enabled:
             return
 
+        pending = self._pending_alert
+        if pending is None or confidence > pending["confidence"]:
+            self._pending_alert = {
+                "frame": frame,
+                "confidence": confidence,
+                "timestamp": timestamp,
+                "analysis_text": analysis_text,
+                "analysis_confidence": analysis_confidence,
+                "send_gif": send_gif or (pending is not None and pending["send_gif"]),
+            }
+        elif send_gif:
+            pending["send_gif"] = True
+
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_alert())
+
+    async def _flush_alert(self):
+        """Wait out the batch window, then deliver the best pending alert."""
+        try:
+            await asyncio.sleep(self.ALERT_BATCH_WINDOW)
+        finally:
+            self._flush_task = None
+        alert, self._pending_alert = self._pending_alert, None
+        if alert:
+            await self._deliver_alert(**alert)
+
+    async def _deliver_alert(
+        self,
+        frame: np.ndarray,
+        confidence: float,
+        timestamp: datetime,
+        analysis_text: Optional[str] = None,
+        analysis_confidence: Optional[float] = None,
+        send_gif: bool = False
+    ):
+        """Send detection alert with screenshot and optional GIF."""
         if not await self._ensure_bot():
             return
 
         try:
-            # Send screenshot
-            if runtime_settings.telegram_screenshot:
-                await self._send_screenshot(frame, confidence, timestamp, analysis_text, analysis_confidence)
-
-            # Generate and send GIF (runs in background)
-            if runtime_settings.telegram_gif and send_gif:
+            send_clip = config.runtime_settings.telegram_gif and send_gif
+            if send_clip:
+                # Screenshot and clip go out together as one media group once
+                # the clip is ready (records in the background)
+                photo = caption = None
+                if config.runtime_settings.telegram_screenshot:
+                    photo = self._encode_screenshot(frame)
+                    caption = self._screenshot_caption(confidence, timestamp, analysis_text, analysis_confidence)
                 asyncio.create_task(
-                    self._send_detection_gif(confidence, timestamp)
+                    self._send_detection_gif(confidence, timestamp, photo, caption)
                 )
+            elif config.runtime_settings.telegram_screenshot:
+                await self._send_screenshot(frame, confidence, timestamp, analysis_text, analysis_confidence)
 
-            if analysis_text and not runtime_settings.telegram_screenshot:
+            if analysis_text and not config.runtime_settings.telegram_screenshot:
                 await self._send_analysis_message(analysis_text, analysis_confidence, timestamp)
 
         except Exception as e:
             logger.error(f"Failed to send detection alert: {e}")
 
+    async def close(self):
+        """Drop any alert still waiting for its batch window and close the HTTP client."""
+        if self._flush_task:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+        self._pending_alert = None
+
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+        self._initialized = False
+
     async def _send_screenshot(
         self,
         frame: np.ndarray,
@@ -95,37 +215,47 @@ class NotificationService:
     ):
         """Send screenshot to Telegram."""
         try:
-            # Convert frame to JPEG
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            image = Image.fromarray(rgb_frame)
-
-            # Save to buffer
-            buffer = io.BytesIO()
-            image.save(buffer, format="JPEG", quality=85)
-            buffer.seek(0)
-
-            # Send photo
-            confidence_value = analysis_confidence if analysis_confidence is not None else confidence
-            caption = (
-                f"Person Detected!\n"
-                f"Confidence: {confidence_value:.1f}%\n"
-                f"Time: {timestamp.strftime('%Y-%m-%d %H:%M:%S')}"
-            )
-            if analysis_text:
-                trimmed = analysis_text.strip()[:200]
-                caption += f"\nAI: {trimmed}"
-
-            await self._bot.send_photo(
-                chat_id=self.chat_id,
-                photo=buffer,
-                caption=caption
-            )
+            photo = self._encode_screenshot(frame)
+            caption = self._screenshot_caption(confidence, timestamp, analysis_text, analysis_confidence)
+            await self._send_photo(photo, caption)
 
             logger.info("Detection screenshot sent to Telegram")
 
         except Exception as e:
             logger.error(f"Failed to send screenshot: {e}")
 
+    def _encode_screenshot(self, frame: np.ndarray) -> bytes:
+        """Downscale and JPEG-encode a BGR frame for Telegram."""
+        # Telegram downscales photos past ~1280px anyway; shrink before encoding
+        h, w = frame.shape[:2]
+        long_side = max(h, w)
+        if long_side > self.SCREENSHOT_MAX_SIDE:
+            scale = self.SCREENSHOT_MAX_SIDE / long_side
+            frame = cv2.resize(
+                frame, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA
+            )
+
+        # Encode BGR frame to JPEG directly (no RGB conversion / PIL copy)
+        return self._screenshot_encoder.encode(frame)
+
+    @staticmethod
+    def _screenshot_caption(
+        confidence: float,
+        timestamp: datetime,
+        analysis_text: Optional[str] = None,
+        analysis_confidence: Optional[float] = None
+    ) -> str:
+        confidence_value = analysis_confidence if analysis_confidence is not None else confidence
+        caption = (
+            f"Person Detected!\n"
+            f"Confidence: {confidence_value:.1f}%\n"
+            f"Time: {timestamp.strftime('%Y-%m-%d %H:%M:%S')}"
+        )
+        if analysis_text:
+            trimmed = analysis_text.strip()[:200]
+            caption += f"\nAI: {trimmed}"
+        return caption
+
     async def _send_analysis_message(
         self,
         analysis_text: str,
@@ -143,125 +273,192 @@ class NotificationService:
                 f"Time: {timestamp.strftime('%Y-%m-%d %H:%M:%S')}\n"
                 f"{analysis_text.strip()[:400]}"
             )
-            await self._bot.send_message(
-                chat_id=self.chat_id,
-                text=text
-            )
+            await self._send_message(text)
         except Exception as e:
             logger.error(f"Failed to send analysis message: {e}")
 
-    async def _send_detection_gif(self, confidence: float, timestamp: datetime):
-        """Generate and send a 10-second video clip from the detection."""
+    async def _send_detection_gif(
+        self,
+        confidence: float,
+        timestamp: datetime,
+        photo: Optional[bytes] = None,
+        photo_caption: Optional[str] = None
+    ):
+        """Generate a 10-second clip and send it, grouped with the screenshot if given."""
         try:
-            # Notify user that recording is starting
-            await self._bot.send_message(
-                chat_id=self.chat_id,
-                text="Recording 10 second clip..."
-            )
-
-            # Record 10 seconds from NOW
+            # 10 seconds around the detection, including buffered pre-event frames
             logger.info("Starting 10 second clip recording...")
-            clip_path = await self._generate_gif(duration=10)
+            clip_path = await self._generate_gif(duration=10, pre_seconds=self.CLIP_PRE_SECONDS)
 
             if clip_path and clip_path.exists():
                 file_size = clip_path.stat().st_size / 1024  # KB
                 logger.info(f"Clip generated: {clip_path} ({file_size:.1f} KB)")
 
-                caption = (
-                    f"Detection Clip\n"
-                    f"Confidence: {confidence:.1f}%\n"
-                    f"Time: {timestamp.strftime('%Y-%m-%d %H:%M:%S')}"
-                )
+                video = clip_path.read_bytes()
+                clip_path.unlink()
 
-                # Send as video (MP4 works better than GIF)
-                with open(clip_path, "rb") as f:
-                    await self._bot.send_video(
-                        chat_id=self.chat_id,
-                        video=f,
-                        caption=caption,
-                        supports_streaming=True
+                if photo is not None:
+                    # One API call for screenshot + clip
+                    await self._send_media_group(photo, photo_caption, video)
+                else:
+                    caption = (
+                        f"Detection Clip\n"
+                        f"Confidence: {confidence:.1f}%\n"
+                        f"Time: {timestamp.strftime('%Y-%m-%d %H:%M:%S')}"
                     )
-
-                # Cleanup
-                clip_path.unlink()
+                    # Send as video (MP4 works better than GIF)
+                    await self._send_video(video, caption)
                 logger.info("Detection clip sent to Telegram")
             else:
-                await self._bot.send_message(
-                    chat_id=self.chat_id,
-                    text="Failed to record clip"
-                )
                 logger.error("Clip generation returned None or file doesn't exist")
+                if photo is not None:
+                    await self._send_photo(photo, photo_caption)
+                else:
+                    await self._send_message("Failed to record clip")
 
         except Exception as e:
             logger.error(f"Failed to send clip: {e}")
 
-    async def _generate_gif(self, duration: int = 10) -> Optional[Path]:
-        """Generate MP4 clip from RTSP stream using FFmpeg (better than GIF)."""
+    async def _generate_gif(self, duration: int = 10, pre_seconds: float = 0) -> Optional[Path]:
+        """Generate MP4 clip (better than GIF).
+
+        Uses the detector's sampled frames when it is running, which avoids a
+        second RTSP session and allows pre-event footage; otherwise records
+        the next `duration` seconds straight from RTSP.
+        """
+        source = self.frame_source
+        if source is not None and source.is_running:
+            frames = await source.collect_clip_frames(pre_seconds, duration - pre_seconds)
+            if len(frames) >= 2:
+                return await self._encode_frames(frames)
+            logger.warning("Too few buffered frames for clip, recording from RTSP")
+
+        return await self._record_rtsp_clip(duration)
+
+    async def _encode_frames(self, frames: list[tuple[float, np.ndarray]]) -> Optional[Path]:
+        """Encode timestamped BGR frames to MP4 by piping raw video into FFmpeg."""
         try:
-            from backend.config import settings
+            # Stream resolution can change across reconnects; keep the latest size
+            shape = frames[-1][1].shape
+            frames = [item for item in frames if item[1].shape == shape]
+            height, width = shape[:2]
+
+            # Frames are sampled at an adaptive rate; use the average over the clip
+            span = frames[-1][0] - frames[0][0]
+            fps = (len(frames) - 1) / span if span > 0 else 1.0
+
+            output_path = Path(tempfile.mktemp(suffix=".mp4"))
+            encoder = await detect_h264_encoder()
+            cmd = [
+                FFMPEG,
+                "-y",
+                "-hide_banner",
+                "-loglevel", "error",
+                *device_args(encoder),
+                "-f", "rawvideo",
+                "-pix_fmt", "bgr24",
+                "-s", f"{width}x{height}",
+                "-r", f"{fps:.3f}",
+                "-i", "-",
+                *video_args(encoder, 50, bitrate="800k"),
+                str(output_path)
+            ]
+            raw = b"".join(frame.tobytes() for _, frame in frames)
+            logger.info(f"Encoding {len(frames)} buffered frames at {fps:.1f} fps")
+            return await self._run_clip_ffmpeg(cmd, output_path, timeout=30, stdin=raw)
 
+        except Exception as e:
+            logger.error(f"Clip generation error: {e}")
+            return None
+
+    async def _record_rtsp_clip(self, duration: int) -> Optional[Path]:
+        """Record a clip directly from the RTSP stream."""
+        try:
             # Use MP4 instead of GIF - smaller file, better quality
             output_path = Path(tempfile.mktemp(suffix=".mp4"))
 
-            rtsp_url = settings.rtsp_url_low
+            rtsp_url = config.settings.rtsp_url_low
             logger.info(f"Recording {duration}s clip from: {rtsp_url}")
 
+            # The camera already sends H.264; only re-encode when a smaller clip is wanted
+            if config.runtime_settings.clip_scale:
+                encoder = await detect_h264_encoder()
+                decode_args = input_args(encoder)
+                encode_args = video_args(encoder, 50, width=480, bitrate="800k")
+            else:
+                decode_args = []
+                encode_args = ["-c:v", "copy"]
+
             cmd = [
-                "ffmpeg",
+                FFMPEG,
                 "-y",
+                "-hide_banner",
+                "-loglevel", "error",
                 "-rtsp_transport", "tcp",
-                "-fflags", "+genpts+discardcorrupt",
-                "-analyzeduration", "2000000",
-                "-probesize", "2000000",
+                "-fflags", "+genpts+discardcorrupt+nobuffer",
+                "-flags", "low_delay",
+                # The camera is known H.264, so a short bounded probe is enough;
+                # skipping it entirely can miss SPS/PPS and the frame size
+                "-analyzeduration", "500000",
+                "-probesize", "500000",
+                "-f", "rtsp",
+                "-c:v", "h264",
+                *decode_args,
                 "-i", rtsp_url,
                 "-t", str(duration),
-                "-vf", "scale=480:-2",
-                "-c:v", "libx264",
-                "-preset", "ultrafast",
-                "-crf", "28",
+                *encode_args,
                 "-an",  # No audio
-                "-movflags", "+faststart",
                 str(output_path)
             ]
 
             logger.info(f"FFmpeg command: {' '.join(cmd)}")
+            return await self._run_clip_ffmpeg(cmd, output_path, timeout=duration + 30)
 
-            # Use async subprocess for better handling
-            process = await asyncio.create_subprocess_exec(
-                *cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
+        except Exception as e:
+            logger.error(f"Clip generation error: {e}")
+            return None
 
-            try:
-                stdout, stderr = await asyncio.wait_for(
-                    process.communicate(),
-                    timeout=duration + 30
-                )
-            except asyncio.TimeoutError:
-                process.kill()
-                await process.wait()
-                logger.error("FFmpeg timed out")
-                return None
+    async def _run_clip_ffmpeg(
+        self,
+        cmd: list,
+        output_path: Path,
+        timeout: float,
+        stdin: Optional[bytes] = None
+    ) -> Optional[Path]:
+        """Run a clip FFmpeg command and return the output path if it produced a file."""
+        # stdout is unused; stderr is kept small with -loglevel error
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdin=asyncio.subprocess.PIPE if stdin is not None else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE
+        )
 
-            if process.returncode == 0 and output_path.exists():
-                file_size = output_path.stat().st_size
-                if file_size > 0:
-                    logger.info(f"Clip created successfully: {file_size} bytes")
-                    return output_path
-                else:
-                    logger.error("FFmpeg created empty file")
-                    output_path.unlink()
-                    return None
+        try:
+            _, stderr = await asyncio.wait_for(
+                process.communicate(input=stdin),
+                timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            logger.error("FFmpeg timed out")
+            return None
+
+        if process.returncode == 0 and output_path.exists():
+            file_size = output_path.stat().st_size
+            if file_size > 0:
+                logger.info(f"Clip created successfully: {file_size} bytes")
+                return output_path
             else:
-                stderr_text = stderr.decode()[-1000:] if stderr else "No stderr"
-                logger.error(f"FFmpeg failed (code {process.returncode}): {stderr_text}")
-                if output_path.exists():
-                    output_path.unlink()
+                logger.error("FFmpeg created empty file")
+                output_path.unlink()
                 return None
-
-        except Exception as e:
-            logger.error(f"Clip generation error: {e}")
+        else:
+            stderr_text = stderr.decode()[-1000:] if stderr else "No stderr"
+            logger.error(f"FFmpeg failed (code {process.returncode}): {stderr_text}")
+            if output_path.exists():
+                output_path.unlink()
             return None
 
     async def send_test_message(self) -> bool:
@@ -270,10 +467,7 @@ class NotificationService:
             return False
 
         try:
-            await self._bot.send_message(
-                chat_id=self.chat_id,
-                text="Security Camera Dashboard - Test notification\nConnection successful!"
-            )
+            await self._send_message("Security Camera Dashboard - Test notification\nConnection successful!")
             logger.info("Test message sent successfully")
             return True
         except Exception as e:
@@ -282,17 +476,14 @@ class NotificationService:
 
     async def send_startup_message(self):
         """Send a startup notification."""
-        if not runtime_settings.telegram_enabled:
+        if not config.runtime_settings.telegram_enabled:
             return
 
         if not await self._ensure_bot():
             return
 
         try:
-            await self._bot.send_message(
-                chat_id=self.chat_id,
-                text="Security Camera Dashboard started\nMonitoring active."
-            )
+            await self._send_message("Security Camera Dashboard started\nMonitoring active.")
         except Exception as e:
             logger.error(f"Failed to send startup message: {e}")
 
@@ -303,10 +494,7 @@ class NotificationService:
 
         try:
             # Notify user that recording is starting
-            await self._bot.send_message(
-                chat_id=self.chat_id,
-                text="Recording 10 second test clip..."
-            )
+            await self._send_message("Recording 10 second test clip...")
 
             # Record 10 seconds from NOW
             logger.info("Starting test clip recording (10 seconds)...")
@@ -322,22 +510,13 @@ class NotificationService:
                     f"Duration: 10 seconds"
                 )
 
-                with open(clip_path, "rb") as f:
-                    await self._bot.send_video(
-                        chat_id=self.chat_id,
-                        video=f,
-                        caption=caption,
-                        supports_streaming=True
-                    )
+                await self._send_video(clip_path.read_bytes(), caption)
 
                 clip_path.unlink()
                 logger.info("Test GIF sent successfully")
                 return True
             else:
-                await self._bot.send_message(
-                    chat_id=self.chat_id,
-                    text="Failed to record test clip - check RTSP stream"
-                )
+                await self._send_message("Failed to record test clip - check RTSP stream")
                 logger.error("Failed to generate test GIF - clip_path is None or doesn't exist")
                 return False
 
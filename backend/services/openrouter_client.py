@@ -1,15 +1,49 @@
+import base64
 import json
 import logging
-from datetime import date, datetime
+import re
+import time
 from typing import Optional
-from urllib import request, error
+
+import cv2
+import httpx
+import numpy as np
+import orjson
 
 logger = logging.getLogger(__name__)
 
+# The vision model doesn't need full resolution; smaller uploads return faster
+ANALYSIS_WIDTH = 512
+ANALYSIS_JPEG_QUALITY = 70
+
+# Outermost {...} span of a model reply
+_JSON_BLOCK_RE = re.compile(r"\{.*\}", re.S)
+_JSON_DECODER = json.JSONDecoder()
+
+
+def encode_frame_b64(frame: np.ndarray) -> str:
+    """Downscale a BGR frame and encode it as base64 JPEG for analysis."""
+    height, width = frame.shape[:2]
+    if width > ANALYSIS_WIDTH:
+        frame = cv2.resize(
+            frame, (ANALYSIS_WIDTH, int(height * ANALYSIS_WIDTH / width)), interpolation=cv2.INTER_AREA
+        )
+    ok, buffer = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), ANALYSIS_JPEG_QUALITY])
+    if not ok:
+        raise RuntimeError("JPEG encoding failed")
+    # The encoded ndarray supports the buffer protocol; no tobytes() copy needed
+    return base64.b64encode(buffer).decode("ascii")
+
 
 class OpenRouterClient:
     """Minimal OpenRouter client for image analysis."""
 
+    API_URL = "https://openrouter.ai/api/v1/chat/completions"
+
+    # Retries for transient 5xx responses, with exponential backoff
+    MAX_RETRIES = 2
+    RETRY_BACKOFF = 1.0  # seconds, doubled per attempt
+
     def __init__(
         self,
         api_key: str,
@@ -21,24 +55,41 @@ class OpenRouterClient:
         self.model = model
         self.daily_limit = daily_limit
         self.min_interval_seconds = min_interval_seconds
-        self._daily_date = date.today()
+        # Epoch day number for the daily counter; cheaper than date objects
+        self._daily_epoch = int(time.time() // 86400)
         self._daily_count = 0
-        self._last_request_time: Optional[datetime] = None
+        self._last_request_mono: Optional[float] = None
+        # Keep-alive session so repeated analyses reuse the TLS connection
+        self._session = httpx.Client(
+            http2=True,
+            timeout=45,
+            headers={
+                "Authorization": f"Bearer {self.api_key}",
+                "HTTP-Referer": "http://localhost",
+                "X-Title": "Security Camera Dashboard",
+            },
+        )
+
+    def close(self) -> None:
+        self._session.close()
 
     def _reset_if_new_day(self) -> None:
-        today = date.today()
-        if self._daily_date != today:
-            self._daily_date = today
+        day = int(time.time() // 86400)
+        if day != self._daily_epoch:
+            self._daily_epoch = day
             self._daily_count = 0
 
     def _rate_limit_ok(self) -> bool:
         self._reset_if_new_day()
         if self._daily_count >= self.daily_limit:
             return False
-        if self._last_request_time is None:
+        if self._last_request_mono is None:
             return True
-        elapsed = (datetime.now() - self._last_request_time).total_seconds()
-        return elapsed >= self.min_interval_seconds
+        return time.monotonic() - self._last_request_mono >= self.min_interval_seconds
+
+    def analyze_frame(self, frame: np.ndarray, prompt: str) -> dict:
+        """Analyze a BGR frame, downscaling it before upload."""
+        return self.analyze_image_base64(encode_frame_b64(frame), prompt)
 
     def analyze_image_base64(self, image_b64: str, prompt: str) -> dict:
         if not self.api_key:
@@ -85,30 +136,18 @@ class OpenRouterClient:
             "max_tokens": 200,
         }
 
-        req = request.Request(
-            "https://openrouter.ai/api/v1/chat/completions",
-            data=json.dumps(payload).encode("utf-8"),
-            headers={
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {self.api_key}",
-                "HTTP-Referer": "http://localhost",
-                "X-Title": "Security Camera Dashboard",
-            },
-            method="POST",
-        )
-
         try:
-            with request.urlopen(req, timeout=45) as response:
-                data = json.loads(response.read().decode("utf-8"))
-        except error.HTTPError as e:
-            logger.error(f"OpenRouter HTTP error: {e.read().decode('utf-8')}")
-            return {
-                "summary": "OpenRouter request failed.",
-                "person_detected": None,
-                "confidence": 0,
-                "model": self.model,
-                "error": f"http_{e.code}",
-            }
+            response = self._post_with_retry(payload)
+            if response.status_code >= 400:
+                logger.error(f"OpenRouter HTTP error: {response.text}")
+                return {
+                    "summary": "OpenRouter request failed.",
+                    "person_detected": None,
+                    "confidence": 0,
+                    "model": self.model,
+                    "error": f"http_{response.status_code}",
+                }
+            data = orjson.loads(response.content)
         except Exception as e:
             logger.error(f"OpenRouter request error: {e}")
             return {
@@ -126,7 +165,7 @@ class OpenRouterClient:
             content = ""
 
         self._daily_count += 1
-        self._last_request_time = datetime.now()
+        self._last_request_mono = time.monotonic()
 
         parsed = self._extract_json(content)
         if not parsed:
@@ -156,15 +195,38 @@ class OpenRouterClient:
             "error": None,
         }
 
+    def _post_with_retry(self, payload: dict) -> httpx.Response:
+        """POST the payload, retrying transient server errors."""
+        # Serialize once; the base64 image dominates the payload
+        body = orjson.dumps(payload)
+        delay = self.RETRY_BACKOFF
+        for attempt in range(self.MAX_RETRIES + 1):
+            response = self._session.post(
+                self.API_URL,
+                content=body,
+                headers={"Content-Type": "application/json"},
+            )
+            if response.status_code < 500 or attempt == self.MAX_RETRIES:
+                return response
+            logger.warning(f"OpenRouter returned {response.status_code}, retrying in {delay:.0f}s")
+            time.sleep(delay)
+            delay *= 2
+        return response
+
     @staticmethod
     def _extract_json(text: str) -> Optional[dict]:
         if not text:
             return None
-        start = text.find("{")
-        end = text.rfind("}")
-        if start == -1 or end == -1 or end <= start:
+        match = _JSON_BLOCK_RE.search(text)
+        if not match:
             return None
         try:
-            return json.loads(text[start:end + 1])
-        except Exception:
+            return orjson.loads(match.group())
+        except orjson.JSONDecodeError:
+            pass
+        # Commentary after the JSON may contain braces; decode only the first object
+        try:
+            parsed, _ = _JSON_DECODER.raw_decode(text, match.start())
+        except ValueError:
             return None
+        return parsed if isinstance(parsed, dict) else None
@@ -1,17 +1,22 @@
 import asyncio
 import logging
 import os
+import platform
+import threading
+import time
 import urllib.request
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 from typing import Optional
 
 import cv2
 import numpy as np
-from PIL import Image
 
-from backend.config import runtime_settings, settings
+from backend import config
 from backend.services.event_store import EventStore
+from backend.services.jpeg_encoder import AdaptiveJpegEncoder
 from backend.services.notification import NotificationService
 from backend.websocket.manager import ConnectionManager
 
@@ -38,6 +43,79 @@ MOBILENET_CLASSES = [
 ALERT_CLASSES = {"person", "cat", "dog", "car", "motorcycle", "truck", "bird"}
 
 
+def _box_iou(a: tuple, b: tuple) -> float:
+    """Intersection over union of two (x1, y1, x2, y2) boxes."""
+    inter_w = min(a[2], b[2]) - max(a[0], b[0])
+    inter_h = min(a[3], b[3]) - max(a[1], b[1])
+    if inter_w <= 0 or inter_h <= 0:
+        return 0.0
+    inter = inter_w * inter_h
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _configure_opencv():
+    """Enable OpenCV's optimized kernels and thread pool, logging what the build supports."""
+    cv2.setUseOptimized(True)
+    cv2.setNumThreads(os.cpu_count() or 4)
+
+    # Only the SIMD and parallel framework lines of the (long) build report matter here
+    for line in cv2.getBuildInformation().splitlines():
+        line = line.strip()
+        if line.startswith(("Baseline:", "Dispatched code generation:", "Parallel framework:")):
+            logger.info(f"OpenCV {line}")
+    logger.info(f"OpenCV optimized={cv2.useOptimized()} threads={cv2.getNumThreads()}")
+
+
+class _FrameGrabber:
+    """Drains an RTSP capture on its own thread, decoding a frame only when asked.
+
+    grab() keeps the socket and decoder current so a requested frame is always
+    the freshest one, while retrieve() (colour conversion) only runs for
+    frames that are actually processed.
+    """
+
+    def __init__(self, cap: cv2.VideoCapture):
+        self._cap = cap
+        self._stop = threading.Event()
+        self._wanted = threading.Event()
+        self._ready = threading.Event()
+        self._frame: Optional[np.ndarray] = None
+        self._thread = threading.Thread(target=self._run, name="rtsp-grabber", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            if not self._cap.grab():
+                break
+            if self._wanted.is_set():
+                ok, frame = self._cap.retrieve()
+                if ok:
+                    self._frame = frame
+                    self._wanted.clear()
+                    self._ready.set()
+        self._stop.set()
+        # Wake a pending read() so it sees the stream has ended
+        self._ready.set()
+
+    def read(self, timeout: float) -> Optional[np.ndarray]:
+        """Block until the next frame is decoded; None if the stream ended or timed out."""
+        if self._stop.is_set():
+            return None
+        self._frame = None
+        self._ready.clear()
+        self._wanted.set()
+        if not self._ready.wait(timeout):
+            return None
+        return self._frame
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
 class PersonDetector:
     """Motion + MobileNet-SSD based detection for Orange Pi / ARM devices.
 
@@ -46,6 +124,7 @@ class PersonDetector:
     - Adaptive sampling rate (faster when motion detected)
     """
 
+    QUANTIZED_MODEL_NAME = "mobilenet_ssd_int8.onnx"
     MODEL_URL = "https://github.com/chuanqi305/MobileNet-SSD/raw/master/mobilenet_iter_73000.caffemodel"
     PROTOTXT_URL = "https://raw.githubusercontent.com/chuanqi305/MobileNet-SSD/master/deploy.prototxt"
 
@@ -57,11 +136,49 @@ class PersonDetector:
     ]
     VOC_ALERT_CLASSES = {"person", "cat", "dog", "car", "motorbike", "bird"}
 
+    # MobileNet-SSD input normalization: (pixel - 127.5) / 127.5 on every channel
+    BLOB_SCALE = 1 / 127.5
+    BLOB_MEAN = (127.5, 127.5, 127.5)
+
     # Sampling rate constants
     FAST_INTERVAL = 0.2    # 5 FPS when motion detected
     NORMAL_INTERVAL = 0.5  # 2 FPS normal monitoring
     IDLE_INTERVAL = 1.0    # 1 FPS when idle for a while
 
+    # RTSP open/read timeout so a dead camera doesn't hang the capture
+    CAPTURE_TIMEOUT_MS = 5000
+
+    # Frames are downscaled once to this width for motion, DNN and clip buffering
+    ANALYSIS_WIDTH = 600
+
+    # Motion scoring runs on frames downscaled to this width
+    MOTION_WIDTH = 320
+
+    # Object detection needs one motion blob covering at least this fraction of the frame
+    MIN_BLOB_RATIO = 0.005
+
+    # The DNN only sees a padded crop around the largest motion blob when that
+    # blob covers less than MAX_ROI_FRACTION of the frame
+    MAX_ROI_FRACTION = 0.3
+    ROI_PAD = 0.2
+
+    # Saved thumbnails are downscaled to this width
+    THUMBNAIL_WIDTH = 640
+    # Pending thumbnail writes; new thumbnails are skipped when a burst overflows it
+    THUMBNAIL_QUEUE_SIZE = 4
+
+    # Rolling buffer of sampled frames so alert clips can include pre-event footage
+    FRAME_BUFFER_SECONDS = 5
+    CLIP_WIDTH = 480
+
+    # With MOTION_GATE=none the DNN runs this often, sampling at FAST_INTERVAL
+    UNGATED_DETECT_SECONDS = 0.6
+    # Without a motion gate, a stationary object (e.g. a parked car) is only
+    # reported again once no same-class box overlapping it by UNGATED_DEDUPE_IOU
+    # has been seen for UNGATED_HOLD_SECONDS
+    UNGATED_DEDUPE_IOU = 0.5
+    UNGATED_HOLD_SECONDS = 60
+
     def __init__(
         self,
         rtsp_url: str,
@@ -69,7 +186,7 @@ class PersonDetector:
         notification_service: NotificationService,
         ws_manager: ConnectionManager,
         thumbnails_dir: Path,
-        consecutive_frames_required: int = 1  # Faster detection with single frame
+        consecutive_frames_required: int = 2  # Second frame filters one-off noise before the DNN runs
     ):
         self.rtsp_url = rtsp_url
         self.event_store = event_store
@@ -77,8 +194,16 @@ class PersonDetector:
         self.ws_manager = ws_manager
         self.thumbnails_dir = thumbnails_dir
         self.consecutive_frames_required = consecutive_frames_required
+        _configure_opencv()
         self._running = False
         self._task: Optional[asyncio.Task] = None
+        self._thumbnail_queue: asyncio.Queue = asyncio.Queue(maxsize=self.THUMBNAIL_QUEUE_SIZE)
+        self._thumbnail_task: Optional[asyncio.Task] = None
+        # Pre-rendered thumbnail labels: (text, color) -> (sprite, mask, baseline row)
+        self._label_sprites: dict[tuple[str, tuple[int, int, int]], tuple[np.ndarray, np.ndarray, int]] = {}
+        # Formatted timestamp of the last thumbnail's second
+        self._thumbnail_second = 0
+        self._thumbnail_prefix = ""
         self._last_detection_time: Optional[datetime] = None
         self._net: Optional[cv2.dnn.Net] = None
         self._model_dir = Path("data/models")
@@ -89,13 +214,63 @@ class PersonDetector:
 
         # Consecutive frame tracking
         self._motion_frame_count = 0
+        # Frames seen since the last ungated DNN pass
+        self._ungated_frame_count = 0
+        self._ungated_every = max(1, round(self.UNGATED_DETECT_SECONDS / self.FAST_INTERVAL))
+        # Objects already reported by the ungated path: [class, box, last seen (monotonic)]
+        self._ungated_seen: list[list] = []
+        # Largest motion blob of the last scored frame, as a fraction of the frame
+        self._largest_blob_ratio = 0.0
+
+        # Thumbnails use the lowest JPEG quality that stays visually lossless
+        self._thumbnail_encoder = AdaptiveJpegEncoder(optimize=True)
+
+        # Reused analysis-size frame and 300x300 DNN input
+        self._analysis_buf: Optional[np.ndarray] = None
+        self._blob_input_buf = np.empty((300, 300, 3), dtype=np.uint8)
+        # OpenCV 4.7+ takes the blob parameters as one prebuilt object
+        self._blob_params = None
+        if hasattr(cv2.dnn, "blobFromImageWithParams"):
+            self._blob_params = cv2.dnn.Image2BlobParams(
+                scalefactor=(self.BLOB_SCALE,) * 3,
+                size=(300, 300),
+                mean=self.BLOB_MEAN,
+                swapRB=False,
+                ddepth=cv2.CV_32F
+            )
+
+        # Reused (small frame, gray, mask, scratch mask) arrays for motion scoring
+        self._motion_buffers: Optional[tuple[np.ndarray, ...]] = None
+        # Size-dependent motion constants, keyed by the input frame shape
+        self._motion_geometry: Optional[tuple] = None
+
+        # Motion scoring runs off the event loop on one thread (MOG2 is stateful)
+        self._motion_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="motion")
+        # One DNN forward in flight at a time so OpenCV's own thread pool gets
+        # every core; thumbnail writes share it as a single JPEG writer
+        self._dnn_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dnn")
+        self._alert_class_ids = np.array(
+            [self.VOC_CLASSES.index(name) for name in self.VOC_ALERT_CLASSES], dtype=np.int32
+        )
         self._last_motion_time: Optional[datetime] = None
 
         # Adaptive sampling
         self._current_interval = self.NORMAL_INTERVAL
 
-        # Cached kernel for morphological operations (optimization)
-        self._morph_kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
+        # Cached kernel for morphological operations (optimization);
+        # 3x3 at MOTION_WIDTH covers roughly what 5x5 did at half resolution.
+        # A rectangular (box) kernel takes OpenCV's separable min/max fast path
+        self._morph_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+        self._dilate_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (7, 7))
+
+        # (monotonic time, clip-sized frame) pairs; sized for the fastest sampling rate
+        self._frame_ring: deque = deque(maxlen=int(self.FRAME_BUFFER_SECONDS / self.FAST_INTERVAL))
+        # Lists receiving new clip frames while a clip is being recorded
+        self._clip_listeners: list[list] = []
+
+        # Most recent full-resolution frame, shared with snapshot callers
+        self._latest_frame_lock = threading.Lock()
+        self._latest_frame: Optional[np.ndarray] = None
 
     @property
     def is_running(self) -> bool:
@@ -133,6 +308,10 @@ class PersonDetector:
         if self._model_loaded:
             return self._net is not None
 
+        if config.settings.detector_quantized and self._load_quantized_model():
+            self._model_loaded = True
+            return True
+
         caffemodel_path = self._model_dir / "mobilenet_ssd.caffemodel"
         prototxt_path = self._model_dir / "mobilenet_ssd.prototxt"
 
@@ -147,9 +326,7 @@ class PersonDetector:
                 str(prototxt_path),
                 str(caffemodel_path)
             )
-            # Use CPU backend (works on Orange Pi)
-            self._net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
-            self._net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+            self._configure_net()
             self._model_loaded = True
             logger.info("MobileNet-SSD model loaded successfully")
             return True
@@ -158,21 +335,66 @@ class PersonDetector:
             self._model_loaded = True
             return False
 
+    def _configure_net(self):
+        """Pick the DNN backend: OpenVINO when this OpenCV build has it, else OpenCV on CPU."""
+        backends = {backend for backend, _ in cv2.dnn.getAvailableBackends()}
+        if cv2.dnn.DNN_BACKEND_INFERENCE_ENGINE in backends:
+            self._net.setPreferableBackend(cv2.dnn.DNN_BACKEND_INFERENCE_ENGINE)
+            logger.info("Using OpenVINO DNN backend")
+        else:
+            # Use CPU backend (works on Orange Pi)
+            self._net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self._net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+
+    def _load_quantized_model(self) -> bool:
+        """Load the INT8 MobileNet-SSD ONNX model if one has been provided.
+
+        The model must keep the Caffe DetectionOutput layout ([1, 1, N, 7])
+        so _run_detection can parse it unchanged.
+        """
+        onnx_path = self._model_dir / self.QUANTIZED_MODEL_NAME
+        if not onnx_path.exists():
+            logger.warning(f"Quantized model {onnx_path} not found, falling back to FP32 Caffe model")
+            return False
+
+        # INT8 dot-product instructions (SDOT/UDOT) are only available on 64-bit ARM
+        machine = platform.machine().lower()
+        if machine.startswith("arm") and machine != "arm64":
+            logger.warning(f"INT8 model on {machine}: 32-bit ARM lacks SDOT/UDOT, expect little speedup")
+
+        try:
+            self._net = cv2.dnn.readNetFromONNX(str(onnx_path))
+            self._configure_net()
+            logger.info("INT8 MobileNet-SSD model loaded successfully")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to load quantized model: {e}")
+            self._net = None
+            return False
+
+    @staticmethod
+    def _create_bg_subtractor() -> cv2.BackgroundSubtractorMOG2:
+        """Create the MOG2 background subtractor for grayscale frames.
+
+        history=120: ~25-60s of background at the 2-5 FPS sampling rates
+        varThreshold=8: Sensitivity (lower = more sensitive); single-channel
+            variance is lower than BGR, so this sits below the old 12
+        detectShadows=False: Skips the per-pixel shadow test; the mask is
+            plain 0/255 and the DNN filters what shadows still trigger
+        """
+        return cv2.createBackgroundSubtractorMOG2(
+            history=120,
+            varThreshold=8,
+            detectShadows=False
+        )
+
     async def start(self):
         """Start the detection service."""
         if self._running:
             logger.warning("Detector already running")
             return
 
-        # Initialize MOG2 background subtractor
-        # history=500: Use last 500 frames for background model
-        # varThreshold=12: Sensitivity (lower = more sensitive)
-        # detectShadows=True: Detect and mark shadows separately
-        self._bg_subtractor = cv2.createBackgroundSubtractorMOG2(
-            history=500,
-            varThreshold=12,
-            detectShadows=True
-        )
+        self._bg_subtractor = self._create_bg_subtractor()
 
         # Load model in background
         loop = asyncio.get_event_loop()
@@ -180,6 +402,7 @@ class PersonDetector:
 
         self._running = True
         self._task = asyncio.create_task(self._detection_loop())
+        self._thumbnail_task = asyncio.create_task(self._thumbnail_writer())
         logger.info("Person detector started with MOG2 background subtraction")
         await self.ws_manager.send_status_update("detector", "running", "Detection active")
 
@@ -192,18 +415,42 @@ class PersonDetector:
                 await self._task
             except asyncio.CancelledError:
                 pass
+        if self._thumbnail_task:
+            self._thumbnail_task.cancel()
+            try:
+                await self._thumbnail_task
+            except asyncio.CancelledError:
+                pass
+        self._motion_executor.shutdown(wait=False)
+        self._dnn_executor.shutdown(wait=False)
         logger.info("Person detector stopped")
         await self.ws_manager.send_status_update("detector", "stopped", "Detection stopped")
 
+    def _open_capture(self) -> cv2.VideoCapture:
+        """Open the RTSP stream with the FFmpeg backend, minimal buffering and timeouts."""
+        # Timeouts only take effect when passed at open time
+        cap = cv2.VideoCapture(
+            self.rtsp_url,
+            cv2.CAP_FFMPEG,
+            [
+                cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, self.CAPTURE_TIMEOUT_MS,
+                cv2.CAP_PROP_READ_TIMEOUT_MSEC, self.CAPTURE_TIMEOUT_MS,
+            ]
+        )
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Minimize buffer for real-time
+        return cap
+
     async def _detection_loop(self):
         """Main detection loop - samples frames from RTSP stream with adaptive rate."""
         retry_delay = 5
-        cap = None
+        loop = asyncio.get_event_loop()
 
         while self._running:
+            cap = None
+            grabber = None
             try:
-                cap = cv2.VideoCapture(self.rtsp_url, cv2.CAP_FFMPEG)
-                cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Minimize buffer for real-time
+                # Opening can block for the full connect timeout; keep it off the loop
+                cap = await loop.run_in_executor(None, self._open_capture)
 
                 if not cap.isOpened():
                     raise RuntimeError("Failed to open RTSP stream")
@@ -214,17 +461,26 @@ class PersonDetector:
 
                 # Reset background subtractor on reconnect
                 if self._bg_subtractor:
-                    self._bg_subtractor = cv2.createBackgroundSubtractorMOG2(
-                        history=500, varThreshold=12, detectShadows=True
-                    )
+                    self._bg_subtractor = self._create_bg_subtractor()
 
-                while self._running and cap.isOpened():
-                    ret, frame = cap.read()
-                    if not ret:
+                grabber = _FrameGrabber(cap)
+                grabber.start()
+
+                while self._running:
+                    frame = await loop.run_in_executor(
+                        None, grabber.read, self.CAPTURE_TIMEOUT_MS / 1000
+                    )
+                    if frame is None:
                         logger.warning("Failed to read frame, reconnecting...")
                         break
 
-                    await self._process_frame(frame)
+                    with self._latest_frame_lock:
+                        self._latest_frame = frame
+                    # One downscale feeds motion scoring, the DNN and the clip buffer;
+                    # the full-resolution frame is only kept for thumbnails/alerts
+                    small = self._downscale_for_analysis(frame)
+                    self._remember_frame(small)
+                    await self._process_frame(frame, small)
 
                     # Adaptive sleep based on motion state
                     await asyncio.sleep(self._current_interval)
@@ -233,8 +489,13 @@ class PersonDetector:
                 logger.error(f"Detection error: {e}")
 
             finally:
+                if grabber:
+                    await loop.run_in_executor(None, grabber.stop)
                 if cap:
                     cap.release()
+                # Don't serve a stale snapshot while reconnecting
+                with self._latest_frame_lock:
+                    self._latest_frame = None
 
             if self._running:
                 logger.info(f"Reconnecting detector in {retry_delay} seconds...")
@@ -245,13 +506,63 @@ class PersonDetector:
                 await asyncio.sleep(retry_delay)
                 retry_delay = min(retry_delay * 2, 60)
 
-    async def _process_frame(self, frame: np.ndarray):
-        """Process a single frame for detection with consecutive frame confirmation."""
+    def _downscale_for_analysis(self, frame: np.ndarray) -> np.ndarray:
+        """Resize a frame to ANALYSIS_WIDTH into a reused buffer."""
+        height, width = frame.shape[:2]
+        if width <= self.ANALYSIS_WIDTH:
+            return frame
+        shape = (int(height * self.ANALYSIS_WIDTH / width), self.ANALYSIS_WIDTH, 3)
+        if self._analysis_buf is None or self._analysis_buf.shape != shape:
+            self._analysis_buf = np.empty(shape, dtype=np.uint8)
+        cv2.resize(frame, (shape[1], shape[0]), dst=self._analysis_buf, interpolation=cv2.INTER_AREA)
+        return self._analysis_buf
+
+    def _remember_frame(self, frame: np.ndarray):
+        """Keep a clip-sized copy of the frame for pre/post-event clips."""
+        height, width = frame.shape[:2]
+        if width > self.CLIP_WIDTH:
+            # Even height keeps H.264 encoders happy
+            clip_height = int(height * self.CLIP_WIDTH / width) // 2 * 2
+            frame = cv2.resize(frame, (self.CLIP_WIDTH, clip_height), interpolation=cv2.INTER_AREA)
+        else:
+            frame = frame.copy()
+
+        item = (time.monotonic(), frame)
+        self._frame_ring.append(item)
+        for listener in self._clip_listeners:
+            listener.append(item)
+
+    async def collect_clip_frames(self, pre_seconds: float, post_seconds: float) -> list[tuple[float, np.ndarray]]:
+        """Return buffered frames from the last pre_seconds plus those sampled over the next post_seconds."""
+        since = time.monotonic() - pre_seconds
+        frames = [item for item in self._frame_ring if item[0] >= since]
+
+        listener: list = []
+        self._clip_listeners.append(listener)
+        try:
+            await asyncio.sleep(post_seconds)
+        finally:
+            self._clip_listeners.remove(listener)
+        return frames + listener
+
+    async def _process_frame(self, frame: np.ndarray, small: np.ndarray):
+        """Process a single frame for detection with consecutive frame confirmation.
+
+        small is the frame downscaled to ANALYSIS_WIDTH, used for all analysis.
+        """
         try:
             now = datetime.now()
 
+            if config.settings.motion_gate == "none":
+                await self._process_frame_ungated(frame, small, now)
+                return
+
             # Step 1: Compute motion using MOG2 background subtraction
-            motion_score, is_global = self._compute_motion_score(frame)
+            # MOG2 keeps state, so it runs on a dedicated single worker thread
+            loop = asyncio.get_event_loop()
+            motion_score, is_global, motion_roi = await loop.run_in_executor(
+                self._motion_executor, self._compute_motion_score, small
+            )
 
             if is_global:
                 # Global change (lighting, camera movement) - reset motion count
@@ -259,7 +570,7 @@ class PersonDetector:
                 self._update_sampling_rate(has_motion=False, now=now)
                 return
 
-            threshold = runtime_settings.detection_threshold
+            threshold = config.runtime_settings.detection_threshold
 
             if motion_score >= threshold:
                 # Motion detected - increment consecutive frame counter
@@ -267,9 +578,11 @@ class PersonDetector:
                 self._update_sampling_rate(has_motion=True, now=now)
 
                 # Only trigger detection after N consecutive frames with motion
-                if self._motion_frame_count >= self.consecutive_frames_required:
+                # and a blob big enough to be an object rather than scattered noise
+                if self._motion_frame_count >= self.consecutive_frames_required and \
+                   self._largest_blob_ratio >= self.MIN_BLOB_RATIO:
                     # Step 2: Run object detection (expensive but motion-confirmed)
-                    detections = await self._detect_objects(frame)
+                    detections = await self._detect_objects(small, frame.shape[:2], motion_roi)
 
                     if detections:
                         # Found relevant objects
@@ -287,6 +600,42 @@ class PersonDetector:
         except Exception as e:
             logger.error(f"Frame processing error: {e}")
 
+    async def _process_frame_ungated(self, frame: np.ndarray, small: np.ndarray, now: datetime):
+        """Run the DNN every Nth frame without any background subtraction."""
+        # Keep sampling fast so the clip buffer stays dense between DNN passes
+        self._current_interval = self.FAST_INTERVAL
+        self._ungated_frame_count += 1
+        if self._ungated_frame_count < self._ungated_every:
+            return
+        self._ungated_frame_count = 0
+
+        detections = await self._detect_objects(small, frame.shape[:2])
+        if detections and self._has_new_object(detections):
+            await self._handle_detection(frame, 0.0, detections)
+            self._last_motion_time = now
+
+    def _has_new_object(self, detections: list[dict]) -> bool:
+        """Track detected objects and report whether any was not already reported."""
+        seen_at = time.monotonic()
+        self._ungated_seen = [
+            entry for entry in self._ungated_seen
+            if seen_at - entry[2] < self.UNGATED_HOLD_SECONDS
+        ]
+
+        has_new = False
+        for detection in detections:
+            for entry in self._ungated_seen:
+                if entry[0] == detection["class"] and \
+                   _box_iou(entry[1], detection["box"]) >= self.UNGATED_DEDUPE_IOU:
+                    # Still there: follow small drifts and extend the hold
+                    entry[1] = detection["box"]
+                    entry[2] = seen_at
+                    break
+            else:
+                self._ungated_seen.append([detection["class"], detection["box"], seen_at])
+                has_new = True
+        return has_new
+
     def _update_sampling_rate(self, has_motion: bool, now: datetime):
         """Adjust sampling rate based on motion activity."""
         if has_motion:
@@ -308,66 +657,104 @@ class PersonDetector:
         else:
             self._current_interval = self.NORMAL_INTERVAL
 
-    def _compute_motion_score(self, frame: np.ndarray) -> tuple[float, bool]:
+    def _build_motion_geometry(self, shape: tuple[int, ...]) -> tuple:
+        """Per-size constants for motion scoring; also (re)allocates the scratch buffers.
+
+        The frame is downscaled to MOTION_WIDTH: the score is an area ratio, so it
+        is resolution independent and MOG2 only has to model ~57k pixels.
+        """
+        height, width = shape[:2]
+        needs_resize = width > self.MOTION_WIDTH
+        if needs_resize:
+            small_shape = (int(height * self.MOTION_WIDTH / width), self.MOTION_WIDTH, 3)
+        else:
+            small_shape = shape
+
+        self._motion_buffers = (
+            np.empty(small_shape, dtype=np.uint8),
+            np.empty(small_shape[:2], dtype=np.uint8),
+            np.empty(small_shape[:2], dtype=np.uint8),
+            np.empty(small_shape[:2], dtype=np.uint8),
+        )
+
+        small_height, small_width = small_shape[:2]
+        frame_area = float(small_height * small_width)
+        return (
+            shape,
+            needs_resize,
+            (small_width, small_height),
+            frame_area,
+            frame_area * 0.001,                          # Minimum blob area (noise filter)
+            (small_width * 0.85, small_height * 0.85),   # Band length thresholds
+            (small_width * 0.25, small_height * 0.25),   # Band thickness thresholds
+        )
+
+    def _compute_motion_score(
+        self, frame: np.ndarray
+    ) -> tuple[float, bool, Optional[tuple[float, float, float, float]]]:
         """Compute motion score using MOG2 background subtraction.
 
         MOG2 advantages over simple frame differencing:
         - Adapts to gradual lighting changes
-        - Handles shadows separately (marked as gray, not white)
         - Builds a statistical model of the background
         - More robust to noise
         """
         if self._bg_subtractor is None:
-            return 0.0, False
+            return 0.0, False, None
 
-        # Downscale frame for faster motion detection (optimization)
-        height, width = frame.shape[:2]
-        scale = 0.5 if width > 640 else 1.0
-        if scale < 1.0:
-            small_frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        # Everything that depends only on the input size is computed once per size
+        if self._motion_geometry is None or self._motion_geometry[0] != frame.shape:
+            self._motion_geometry = self._build_motion_geometry(frame.shape)
+        _, needs_resize, dsize, frame_area, min_area, band_long, band_short = self._motion_geometry
+
+        small_frame, gray, fg_mask, scratch = self._motion_buffers
+
+        if needs_resize:
+            cv2.resize(frame, dsize, dst=small_frame, interpolation=cv2.INTER_AREA)
         else:
             small_frame = frame
 
-        # Apply MOG2 background subtraction
-        # Returns: 255 = foreground, 127 = shadow, 0 = background
-        fg_mask = self._bg_subtractor.apply(small_frame)
+        # A single-channel model is a third of MOG2's per-pixel state and update work
+        cv2.cvtColor(small_frame, cv2.COLOR_BGR2GRAY, dst=gray)
 
-        # Remove shadows (keep only definite foreground)
-        # Shadows are marked as 127, foreground as 255
-        _, fg_mask = cv2.threshold(fg_mask, 200, 255, cv2.THRESH_BINARY)
+        # Apply MOG2 background subtraction
+        # Returns: 255 = foreground, 0 = background (shadow detection is off)
+        self._bg_subtractor.apply(gray, fgmask=fg_mask)
 
-        # Noise removal with morphological operations (using cached kernel)
-        fg_mask = cv2.morphologyEx(fg_mask, cv2.MORPH_OPEN, self._morph_kernel)   # Remove small noise
-        fg_mask = cv2.morphologyEx(fg_mask, cv2.MORPH_CLOSE, self._morph_kernel)  # Fill small holes
-        fg_mask = cv2.dilate(fg_mask, self._morph_kernel, iterations=2)           # Expand regions
+        # Idle frames usually have no foreground at all; skip morphology and contours
+        if cv2.countNonZero(fg_mask) == 0:
+            self._largest_blob_ratio = 0.0
+            return 0.0, False, None
 
-        height, width = fg_mask.shape[:2]
-        frame_area = float(height * width)
+        # Noise removal with morphological operations (using cached kernels).
+        # Close + two dilations by 3x3 is bounded by a single 7x7 dilation
+        # (equal except for tiny gaps close would not have filled), so the
+        # mask is traversed twice instead of four times
+        cv2.morphologyEx(fg_mask, cv2.MORPH_OPEN, self._morph_kernel, dst=scratch)   # Remove small noise
+        cv2.dilate(scratch, self._dilate_kernel, dst=fg_mask)                        # Fill holes, expand regions
 
         if frame_area <= 0:
-            return 0.0, False
+            return 0.0, False, None
 
-        # Find contours in the foreground mask
-        contours, _ = cv2.findContours(fg_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        # One connected-components pass gives every blob's area and bounding box
+        # as an array, replacing findContours plus per-contour area/rect calls
+        _, _, stats, _ = cv2.connectedComponentsWithStats(fg_mask, connectivity=8)
+        areas = stats[1:, cv2.CC_STAT_AREA]  # Row 0 is the background
 
-        # Filter small contours (noise) - minimum 0.1% of frame
-        min_area = frame_area * 0.001
-        total_area = 0.0
+        # Filter small blobs (noise) - minimum 0.1% of frame
+        valid = areas >= min_area
+        valid_contours = int(np.count_nonzero(valid))
+        total_area = float(areas[valid].sum())
         max_area = 0.0
         max_rect = None
-        valid_contours = 0
-
-        for contour in contours:
-            area = cv2.contourArea(contour)
-            if area < min_area:
-                continue
-            valid_contours += 1
-            total_area += area
-            if area > max_area:
-                max_area = area
-                max_rect = cv2.boundingRect(contour)
+
+        if valid_contours:
+            largest = int(np.argmax(areas))
+            max_area = float(areas[largest])
+            max_rect = tuple(int(v) for v in stats[largest + 1, :cv2.CC_STAT_AREA])
 
         area_ratio = total_area / frame_area
+        self._largest_blob_ratio = max_area / frame_area
 
         # Detect global changes (camera movement, major lighting shift)
         # These cause the entire frame to change, not just local motion
@@ -376,8 +763,8 @@ class PersonDetector:
             rect_width = max_rect[2]
             rect_height = max_rect[3]
             # Large horizontal or vertical bands suggest camera movement
-            band_like = (rect_width > width * 0.85 and rect_height > height * 0.25) or \
-                        (rect_height > height * 0.85 and rect_width > width * 0.25)
+            band_like = (rect_width > band_long[0] and rect_height > band_short[1]) or \
+                        (rect_height > band_long[1] and rect_width > band_short[0])
 
         global_change = (
             area_ratio > 0.5 or                    # More than 50% of frame changed
@@ -387,65 +774,115 @@ class PersonDetector:
         )
 
         if global_change:
-            return 0.0, True
+            return 0.0, True, None
 
         # Convert area ratio to 0-100 score
         # More sensitive than before: 10% coverage = 100 score
         motion_score = min(100.0, area_ratio * 1000.0)
-        return motion_score, False
 
-    async def _detect_objects(self, frame: np.ndarray) -> list[dict]:
-        """Run MobileNet-SSD object detection."""
+        # Largest blob as (x1, y1, x2, y2) fractions so it maps onto any frame size
+        motion_roi = None
+        if max_rect is not None:
+            x, y, w, h = max_rect
+            width, height = dsize
+            motion_roi = (x / width, y / height, (x + w) / width, (y + h) / height)
+        return motion_score, False, motion_roi
+
+    async def _detect_objects(
+        self,
+        frame: np.ndarray,
+        full_size: tuple[int, int],
+        roi: Optional[tuple[float, float, float, float]] = None
+    ) -> list[dict]:
+        """Run MobileNet-SSD object detection; boxes are scaled to full_size (height, width).
+
+        roi is the motion region as (x1, y1, x2, y2) frame fractions; when it is
+        small the DNN runs on a padded crop around it instead of the whole frame.
+        """
         if self._net is None:
             return []
 
         try:
             loop = asyncio.get_event_loop()
-            return await loop.run_in_executor(None, self._run_detection, frame)
+            return await loop.run_in_executor(
+                self._dnn_executor, self._run_detection, frame, full_size, roi
+            )
         except Exception as e:
             logger.error(f"Object detection error: {e}")
             return []
 
-    def _run_detection(self, frame: np.ndarray) -> list[dict]:
+    def _crop_to_roi(
+        self, roi: Optional[tuple[float, float, float, float]]
+    ) -> tuple[float, float, float, float]:
+        """Padded crop window as frame fractions; the whole frame if roi is large or missing."""
+        if roi is None:
+            return 0.0, 0.0, 1.0, 1.0
+        x1, y1, x2, y2 = roi
+        if (x2 - x1) * (y2 - y1) >= self.MAX_ROI_FRACTION:
+            return 0.0, 0.0, 1.0, 1.0
+        pad_x = (x2 - x1) * self.ROI_PAD
+        pad_y = (y2 - y1) * self.ROI_PAD
+        return max(0.0, x1 - pad_x), max(0.0, y1 - pad_y), min(1.0, x2 + pad_x), min(1.0, y2 + pad_y)
+
+    def _run_detection(
+        self,
+        frame: np.ndarray,
+        full_size: tuple[int, int],
+        roi: Optional[tuple[float, float, float, float]] = None
+    ) -> list[dict]:
         """Synchronous detection using MobileNet-SSD."""
-        height, width = frame.shape[:2]
+        # Box coordinates are relative, so scale them to the full-resolution frame
+        height, width = full_size
+
+        # Crop around small motion so background pixels don't eat the 300x300 input
+        frame_height, frame_width = frame.shape[:2]
+        cx1, cy1, cx2, cy2 = self._crop_to_roi(roi)
+        left, top = int(cx1 * frame_width), int(cy1 * frame_height)
+        right = max(int(cx2 * frame_width), left + 1)
+        bottom = max(int(cy2 * frame_height), top + 1)
+        crop = frame[top:bottom, left:right]
 
         # Prepare input blob (300x300 for MobileNet-SSD)
-        blob = cv2.dnn.blobFromImage(
-            cv2.resize(frame, (300, 300)),
-            0.007843,  # scale factor
-            (300, 300),
-            127.5  # mean subtraction
-        )
+        cv2.resize(crop, (300, 300), dst=self._blob_input_buf)
+        if self._blob_params is not None:
+            blob = cv2.dnn.blobFromImageWithParams(self._blob_input_buf, self._blob_params)
+        else:
+            blob = cv2.dnn.blobFromImage(
+                self._blob_input_buf,
+                self.BLOB_SCALE,
+                (300, 300),
+                self.BLOB_MEAN,
+                swapRB=False,  # MobileNet-SSD was trained on BGR, as OpenCV decodes
+                crop=False
+            )
 
         self._net.setInput(blob)
         detections_raw = self._net.forward()
 
-        detections = []
-        for i in range(detections_raw.shape[2]):
-            confidence = detections_raw[0, 0, i, 2]
-
-            if confidence < 0.25:  # Minimum confidence threshold (lowered for better detection)
-                continue
+        scale_x = width / frame_width
+        scale_y = height / frame_height
+        box_scale = np.array([(right - left) * scale_x, (bottom - top) * scale_y] * 2)
+        box_offset = np.array([left * scale_x, top * scale_y] * 2)
 
-            class_id = int(detections_raw[0, 0, i, 1])
-            if class_id >= len(self.VOC_CLASSES):
-                continue
+        # Filter all candidates at once; only the few survivors reach Python
+        candidates = detections_raw[0, 0]
+        # Minimum confidence threshold (lowered for better detection)
+        candidates = candidates[candidates[:, 2] >= 0.25]
+        class_ids = candidates[:, 1].astype(np.int32)
+        # Only alert on relevant classes
+        keep = np.isin(class_ids, self._alert_class_ids)
+        candidates = candidates[keep]
+        class_ids = class_ids[keep]
 
-            class_name = self.VOC_CLASSES[class_id]
-
-            # Only alert on relevant classes
-            if class_name not in self.VOC_ALERT_CLASSES:
-                continue
-
-            # Get bounding box
-            box = detections_raw[0, 0, i, 3:7] * np.array([width, height, width, height])
-            (x1, y1, x2, y2) = box.astype("int")
+        # Bounding boxes, mapped from crop-relative to full-frame coordinates
+        boxes = (box_offset + candidates[:, 3:7] * box_scale).astype(np.int32)
 
+        detections = []
+        for class_id, confidence, box in zip(class_ids.tolist(), candidates[:, 2].tolist(), boxes.tolist()):
             detections.append({
-                "class": class_name,
-                "confidence": float(confidence) * 100,
-                "box": (x1, y1, x2, y2)
+                "class": self.VOC_CLASSES[class_id],
+                "confidence": confidence * 100,
+                "box": tuple(box)
             })
 
         return detections
@@ -499,7 +936,7 @@ class PersonDetector:
 
         # Broadcast via WebSocket
         await self.ws_manager.send_detection_event(
-            timestamp=now.isoformat(),
+            timestamp=now,
             confidence=confidence,
             thumbnail_path=f"/thumbnails/{thumbnail_relative}" if thumbnail_relative else None
         )
@@ -507,8 +944,8 @@ class PersonDetector:
         logger.info(f"Detection: {summary} | Confidence: {confidence:.1f}% | Importance: {importance}")
 
         # Send notification (with cooldown)
-        if runtime_settings.telegram_enabled:
-            cooldown = runtime_settings.notification_cooldown_seconds
+        if config.runtime_settings.telegram_enabled:
+            cooldown = config.runtime_settings.notification_cooldown_seconds
             if self._last_detection_time is None or \
                (now - self._last_detection_time).total_seconds() >= cooldown:
 
@@ -527,39 +964,110 @@ class PersonDetector:
                     )
 
     async def _save_thumbnail(self, frame: np.ndarray, timestamp: datetime, detections: list[dict]) -> Optional[Path]:
-        """Save detection frame as thumbnail with bounding boxes."""
-        try:
-            # Draw bounding boxes on frame
-            annotated = frame.copy()
-            for det in detections:
-                x1, y1, x2, y2 = det["box"]
-                color = (0, 255, 0) if det["class"] == "person" else (255, 165, 0)
-                cv2.rectangle(annotated, (x1, y1), (x2, y2), color, 2)
-                label = f"{det['class']}: {det['confidence']:.0f}%"
-                cv2.putText(annotated, label, (x1, y1 - 10),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+        """Queue a detection thumbnail for writing and return the path it will have.
 
-            filename = f"{timestamp.strftime('%Y%m%d_%H%M%S')}.jpg"
-            filepath = self.thumbnails_dir / filename
+        Annotation and JPEG encoding happen on the thumbnail writer task so the
+        detection loop never waits on them. Returns None if the queue is full,
+        since queued jobs' paths have already been handed out to event records.
+        """
+        # Bursts of detections share a second, so its formatted prefix is reused;
+        # the millisecond suffix keeps same-second thumbnails from overwriting each other
+        second = int(timestamp.timestamp())
+        if second != self._thumbnail_second:
+            self._thumbnail_second = second
+            self._thumbnail_prefix = timestamp.strftime('%Y%m%d_%H%M%S')
+        filename = f"{self._thumbnail_prefix}_{timestamp.microsecond // 1000:03d}.jpg"
+        filepath = self.thumbnails_dir / filename
+
+        if self._thumbnail_queue.full():
+            logger.warning(f"Thumbnail queue full, skipping {filename}")
+            return None
+        self._thumbnail_queue.put_nowait((frame, detections, filepath))
+        return filepath
 
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(
-                None,
-                lambda: Image.fromarray(cv2.cvtColor(annotated, cv2.COLOR_BGR2RGB)).save(
-                    filepath, "JPEG", quality=85
+    async def _thumbnail_writer(self):
+        """Write queued thumbnails one at a time on the DNN thread."""
+        loop = asyncio.get_event_loop()
+        while True:
+            frame, detections, filepath = await self._thumbnail_queue.get()
+            try:
+                await loop.run_in_executor(
+                    self._dnn_executor, self._write_thumbnail, frame, detections, filepath
                 )
+            except Exception as e:
+                logger.error(f"Failed to save thumbnail: {e}")
+
+    def _write_thumbnail(self, frame: np.ndarray, detections: list[dict], filepath: Path):
+        """Draw detection boxes on a downscaled copy of the frame and save it as JPEG."""
+        # Shrink first so drawing and JPEG encoding touch far fewer pixels;
+        # resize returns a new array, so the detector's frame is not modified
+        height, width = frame.shape[:2]
+        scale = 1.0
+        if width > self.THUMBNAIL_WIDTH:
+            scale = self.THUMBNAIL_WIDTH / width
+            annotated = cv2.resize(
+                frame, (self.THUMBNAIL_WIDTH, int(height * scale)), interpolation=cv2.INTER_AREA
             )
+        else:
+            annotated = frame.copy()
 
-            return filepath
+        # Draw bounding boxes on the thumbnail
+        for det in detections:
+            x1, y1, x2, y2 = (int(v * scale) for v in det["box"])
+            color = (0, 255, 0) if det["class"] == "person" else (255, 165, 0)
+            cv2.rectangle(annotated, (x1, y1), (x2, y2), color, 2)
+            label = f"{det['class']}: {det['confidence']:.0f}%"
+            self._draw_label(annotated, label, x1, y1 - 10, color)
 
-        except Exception as e:
-            logger.error(f"Failed to save thumbnail: {e}")
-            return None
+        # Encode BGR directly (no RGB conversion or PIL copy) at an adaptive quality
+        filepath.write_bytes(self._thumbnail_encoder.encode(annotated))
+
+    def _draw_label(self, image: np.ndarray, label: str, x: int, y: int, color: tuple[int, int, int]):
+        """Stamp a label with its baseline-left corner at (x, y), like cv2.putText.
+
+        The few dozen distinct labels (alert class + whole-number confidence) are
+        rasterized once and then copied, so thumbnails skip the Hershey renderer.
+        """
+        key = (label, color)
+        sprite = self._label_sprites.get(key)
+        if sprite is None:
+            (text_width, text_height), baseline = cv2.getTextSize(
+                label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2
+            )
+            # A 2px margin holds the stroke width that spills past the text box
+            canvas = np.zeros((text_height + baseline + 4, text_width + 4, 3), dtype=np.uint8)
+            cv2.putText(canvas, label, (2, text_height + 2), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+            sprite = (canvas, canvas.any(axis=2), text_height + 2)
+            self._label_sprites[key] = sprite
+
+        canvas, mask, origin_y = sprite
+        top, left = y - origin_y, x - 2
+        # Clip the sprite to the image, as putText would
+        y0, x0 = max(top, 0), max(left, 0)
+        y1 = min(top + canvas.shape[0], image.shape[0])
+        x1 = min(left + canvas.shape[1], image.shape[1])
+        if y0 >= y1 or x0 >= x1:
+            return
+        sy, sx = y0 - top, x0 - left
+        np.copyto(
+            image[y0:y1, x0:x1],
+            canvas[sy:sy + y1 - y0, sx:sx + x1 - x0],
+            where=mask[sy:sy + y1 - y0, sx:sx + x1 - x0, None]
+        )
 
     def get_current_frame(self) -> Optional[np.ndarray]:
-        """Get a single frame from the stream."""
+        """Get a single frame from the stream.
+
+        Returns a copy of the detector's latest frame while it is running and
+        only opens a new RTSP session otherwise.
+        """
+        if self._running:
+            with self._latest_frame_lock:
+                if self._latest_frame is not None:
+                    return self._latest_frame.copy()
+
         try:
-            cap = cv2.VideoCapture(self.rtsp_url)
+            cap = self._open_capture()
             if cap.isOpened():
                 ret, frame = cap.read()
                 cap.release()
@@ -1,14 +1,28 @@
 import asyncio
 import logging
-import subprocess
-from datetime import datetime
+import os
+import re
+import stat
+from collections import deque
+from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Optional
 
+from backend.services.hw_encoder import FFMPEG
 from backend.websocket.manager import ConnectionManager
 
 logger = logging.getLogger(__name__)
 
+# The segment muxer logs "[segment @ 0x...] Opening '<path>' for writing" per segment;
+# matched on raw bytes so stderr lines are never decoded
+SEGMENT_OPEN_RE = re.compile(rb"Opening '([^']+\.mp4)' for writing")
+# Progress reports ("frame=  123 fps=...") are \r-terminated and repeat every ~0.5s
+PROGRESS_FRAME_RE = re.compile(rb"frame=\s*(\d+)")
+# Progress lines end in \r and log lines in \n
+LINE_END_RE = re.compile(rb"[\r\n]")
+# Lines of FFmpeg output kept for the error log when it exits
+STDERR_TAIL_LINES = 200
+
 
 class RTSPRecorder:
     """Records RTSP stream to 10-minute MP4 segments using FFmpeg."""
@@ -26,14 +40,18 @@ class RTSPRecorder:
         self.ws_manager = ws_manager
         self.segment_duration = segment_duration
         self.stall_timeout = stall_timeout
-        self._process: Optional[subprocess.Popen] = None
+        self._process: Optional[asyncio.subprocess.Process] = None
         self._running = False
         self._task: Optional[asyncio.Task] = None
         self._last_output_time: Optional[datetime] = None
+        # Storage manager told about finished segments; set after construction
+        self.storage_manager = None
+        # The strftime output template makes the command time-independent
+        self._ffmpeg_argv = self._build_ffmpeg_command()
 
     @property
     def is_running(self) -> bool:
-        return self._running and self._process is not None and self._process.poll() is None
+        return self._running and self._process is not None and self._process.returncode is None
 
     async def start(self):
         """Start the recording process."""
@@ -44,17 +62,13 @@ class RTSPRecorder:
         self._running = True
         self._task = asyncio.create_task(self._recording_loop())
         logger.info("RTSP recorder started")
-        await self.ws_manager.send_status_update("recorder", "running", "Recording started")
+        self.ws_manager.send_status_nowait("recorder", "running", "Recording started")
 
     async def stop(self):
         """Stop the recording process."""
         self._running = False
         if self._process:
-            self._process.terminate()
-            try:
-                self._process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                self._process.kill()
+            await self._terminate_process(self._process)
             self._process = None
 
         if self._task:
@@ -65,20 +79,45 @@ class RTSPRecorder:
                 pass
 
         logger.info("RTSP recorder stopped")
-        await self.ws_manager.send_status_update("recorder", "stopped", "Recording stopped")
+        self.ws_manager.send_status_nowait("recorder", "stopped", "Recording stopped")
+
+    @staticmethod
+    async def _terminate_process(process: asyncio.subprocess.Process):
+        """Ask FFmpeg to exit, killing it if it has not within 5 seconds."""
+        if process.returncode is not None:
+            return
+        process.terminate()
+        try:
+            await asyncio.wait_for(process.wait(), timeout=5)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
 
     def _get_output_pattern(self) -> str:
-        """Generate output file pattern for FFmpeg segment muxer."""
-        # Organize by date
-        date_dir = self.output_dir / datetime.now().strftime("%Y-%m-%d")
-        date_dir.mkdir(parents=True, exist_ok=True)
-        return str(date_dir / "%Y%m%d_%H%M%S.mp4")
+        """Generate output file pattern for FFmpeg segment muxer.
+
+        The date directory is part of the strftime template, so segments after
+        midnight land in the new day's directory without restarting FFmpeg.
+        """
+        return str(self.output_dir / "%Y-%m-%d" / "%Y%m%d_%H%M%S.mp4")
+
+    def _ensure_date_dirs(self):
+        """Create today's and tomorrow's directories.
+
+        The segment muxer cannot create directories itself; making tomorrow's
+        ahead of time covers the segment that opens after midnight.
+        """
+        today = datetime.now()
+        for day in (today, today + timedelta(days=1)):
+            (self.output_dir / day.strftime("%Y-%m-%d")).mkdir(parents=True, exist_ok=True)
 
     def _build_ffmpeg_command(self) -> list:
         """Build FFmpeg command for segmented recording."""
         return [
-            "ffmpeg",
+            FFMPEG,
             "-y",
+            # Info level stays on: segment opens and progress drive stall detection
+            "-hide_banner",
             "-rtsp_transport", "tcp",
             "-fflags", "+genpts+discardcorrupt",   # Generate timestamps, discard corrupt
             "-analyzeduration", "1000000",         # 1 second analyze
@@ -112,69 +151,53 @@ class RTSPRecorder:
 
         while self._running:
             try:
-                cmd = self._build_ffmpeg_command()
+                cmd = self._ffmpeg_argv
                 logger.info(f"Starting FFmpeg recording: {' '.join(cmd)}")
+                self._ensure_date_dirs()
 
-                self._process = subprocess.Popen(
-                    cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE
+                # FFmpeg writes nothing useful to stdout; only stderr is followed
+                process = await asyncio.create_subprocess_exec(
+                    *cmd,
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.PIPE
                 )
+                self._process = process
                 self._last_output_time = datetime.now()
 
-                await self.ws_manager.send_status_update("recorder", "connected", "Recording in progress")
-
-                # Track known files for logging new segments
-                known_files = set()
-                last_total_size = 0
-
-                # Monitor process and log new segments
-                while self._running and self._process.poll() is None:
-                    await asyncio.sleep(5)
-
-                    # Update date directory (handles midnight rollover)
-                    date_dir = self.output_dir / datetime.now().strftime("%Y-%m-%d")
-                    date_dir.mkdir(parents=True, exist_ok=True)
-
-                    # Check for new segment files and track output
-                    current_total_size = 0
-                    if date_dir.exists():
-                        current_files = set(f.name for f in date_dir.glob("*.mp4"))
-                        new_files = current_files - known_files
-                        for f in sorted(new_files):
-                            file_path = date_dir / f
-                            size_mb = file_path.stat().st_size / (1024 * 1024)
-                            logger.info(f"Recording segment created: {f} ({size_mb:.2f} MB)")
-                            self._last_output_time = datetime.now()
-                        known_files = current_files
-
-                        # Calculate total size to detect stalls
-                        for f in current_files:
-                            try:
-                                current_total_size += (date_dir / f).stat().st_size
-                            except FileNotFoundError:
-                                pass
-
-                    # Detect stall: no size change means FFmpeg is stuck
-                    if current_total_size > last_total_size:
-                        self._last_output_time = datetime.now()
-                        last_total_size = current_total_size
-                    elif self._last_output_time:
+                self.ws_manager.send_status_nowait("recorder", "connected", "Recording in progress")
+
+                stderr_tail: deque = deque(maxlen=STDERR_TAIL_LINES)
+                reader = asyncio.create_task(self._follow_ffmpeg_output(process.stderr, stderr_tail))
+
+                # Exit is reported by the event loop (SIGCHLD); progress and new
+                # segments come from FFmpeg's own output, so the directory is never
+                # scanned and the timeout only serves as the stall escape hatch
+                process_exit = asyncio.ensure_future(process.wait())
+                try:
+                    while self._running:
+                        done, _ = await asyncio.wait({process_exit}, timeout=self.stall_timeout)
+                        if done:
+                            break
+
                         stall_duration = (datetime.now() - self._last_output_time).total_seconds()
                         if stall_duration > self.stall_timeout:
                             logger.warning(f"Recording stalled for {stall_duration:.0f}s, restarting FFmpeg...")
-                            self._process.terminate()
-                            try:
-                                self._process.wait(timeout=5)
-                            except subprocess.TimeoutExpired:
-                                self._process.kill()
+                            await self._terminate_process(process)
                             break
+                finally:
+                    process_exit.cancel()
+
+                # The reader finishes at EOF once FFmpeg has exited
+                try:
+                    await asyncio.wait_for(reader, timeout=5)
+                except asyncio.TimeoutError:
+                    pass
 
                 # Log exit reason
-                if self._process.returncode is not None and self._process.returncode != 0:
-                    stderr = self._process.stderr.read().decode() if self._process.stderr else ""
-                    logger.error(f"FFmpeg exited with code {self._process.returncode}: {stderr[-500:]}")
-                    await self.ws_manager.send_status_update("recorder", "error", f"FFmpeg error (code {self._process.returncode})")
+                if process.returncode is not None and process.returncode != 0:
+                    stderr = b"\n".join(stderr_tail).decode(errors="replace")
+                    logger.error(f"FFmpeg exited with code {process.returncode}: {stderr[-500:]}")
+                    self.ws_manager.send_status_nowait("recorder", "error", f"FFmpeg error (code {process.returncode})")
 
                 # Reset retry delay on successful connection (ran for at least 30s)
                 if self._last_output_time and (datetime.now() - self._last_output_time).total_seconds() < 10:
@@ -185,52 +208,161 @@ class RTSPRecorder:
 
             if self._running:
                 logger.info(f"Reconnecting in {retry_delay} seconds...")
-                await self.ws_manager.send_status_update(
+                self.ws_manager.send_status_nowait(
                     "recorder", "reconnecting",
                     f"Reconnecting in {retry_delay}s"
                 )
                 await asyncio.sleep(retry_delay)
                 retry_delay = min(retry_delay * 2, 60)  # Exponential backoff
 
-    def get_recordings(self, date: Optional[str] = None) -> list:
-        """List all recording files, optionally filtered by date."""
+    async def _follow_ffmpeg_output(self, stream: asyncio.StreamReader, tail: deque):
+        """Read FFmpeg's stderr: advancing frame counts mark progress, segment opens are logged.
+
+        Runs for the whole life of the process so FFmpeg never blocks on a full
+        stderr pipe; a failure handling one line must not stop the draining.
+        """
+        pending = b""
+        last_frame = -1
+        segment: Optional[Path] = None
+
+        while True:
+            chunk = await stream.read(4096)
+            if not chunk:
+                break
+            # Keep a partial last line for the next chunk
+            *lines, pending = LINE_END_RE.split(pending + chunk)
+            pending = pending[-4096:]
+
+            for line in lines:
+                if not line:
+                    continue
+
+                progress = PROGRESS_FRAME_RE.match(line)
+                if progress:
+                    frame = int(progress.group(1))
+                    if frame > last_frame:
+                        last_frame = frame
+                        self._last_output_time = datetime.now()
+                    continue
+
+                tail.append(line)
+                opened = SEGMENT_OPEN_RE.search(line)
+                if opened:
+                    # A new segment means the previous one is complete
+                    if segment:
+                        self._segment_completed(segment)
+                    segment = Path(os.fsdecode(opened.group(1)))
+                    self._last_output_time = datetime.now()
+                    try:
+                        self._ensure_date_dirs()
+                    except OSError as e:
+                        logger.warning(f"Could not create recording directory: {e}")
+                    self.ws_manager.send_status_nowait(
+                        "recorder", "connected", f"Recording {segment.name}"
+                    )
+
+        if segment:
+            self._segment_completed(segment)
+
+    def _segment_completed(self, path: Path):
+        try:
+            size = path.stat().st_size
+        except OSError:
+            return
+        logger.info(f"Recording segment completed: {path.name} ({size / (1024 * 1024):.2f} MB)")
+        if self.storage_manager:
+            self.storage_manager.register_new_segment(size)
+            # A new segment may push older ones past retention
+            self.storage_manager.kick_cleanup()
+
+    def get_recordings(
+        self,
+        date: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: int = 0
+    ) -> list:
+        """List recording files newest first, optionally filtered by date and paged.
+
+        Segment names (YYYYMMDD_HHMMSS.mp4) sort chronologically and carry their
+        start time, so each returned file costs one stat for its size and
+        nothing past the requested page is touched.
+        """
         recordings = []
+        skipped = 0
 
         if date:
-            date_dir = self.output_dir / date
-            if date_dir.exists():
-                dirs = [date_dir]
-            else:
-                dirs = []
+            date_dirs = [str(self.output_dir / date)]
         else:
-            dirs = sorted(self.output_dir.glob("*"), reverse=True)
-
-        for date_dir in dirs:
-            if date_dir.is_dir() and date_dir.name != ".":
-                for file in sorted(date_dir.glob("*.mp4"), reverse=True):
-                    stat = file.stat()
-                    recordings.append({
-                        "name": file.name,
-                        "date": date_dir.name,
-                        "path": str(file.relative_to(self.output_dir)),
-                        "size_mb": round(stat.st_size / (1024 * 1024), 2),
-                        "created": datetime.fromtimestamp(stat.st_ctime).isoformat()
-                    })
+            try:
+                with os.scandir(self.output_dir) as entries:
+                    date_dirs = sorted(
+                        (e.path for e in entries if e.is_dir() and e.name != "."), reverse=True
+                    )
+            except FileNotFoundError:
+                date_dirs = []
+
+        for date_dir in date_dirs:
+            try:
+                with os.scandir(date_dir) as entries:
+                    files = sorted(
+                        (e for e in entries if e.name.endswith(".mp4") and e.is_file()),
+                        key=lambda e: e.name,
+                        reverse=True
+                    )
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+
+            date_name = os.path.basename(date_dir)
+            for entry in files:
+                if skipped < offset:
+                    skipped += 1
+                    continue
+                if limit is not None and len(recordings) >= limit:
+                    return recordings
+
+                try:
+                    file_stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                try:
+                    created = datetime.strptime(entry.name[:15], "%Y%m%d_%H%M%S")
+                except ValueError:
+                    created = datetime.fromtimestamp(file_stat.st_ctime)
+
+                recordings.append({
+                    "name": entry.name,
+                    "date": date_name,
+                    "path": f"{date_name}/{entry.name}",
+                    "size_mb": round(file_stat.st_size / (1024 * 1024), 2),
+                    "created": created.isoformat()
+                })
 
         return recordings
 
     def get_recording_path(self, date: str, filename: str) -> Optional[Path]:
         """Get full path to a recording file."""
+        result = self.get_recording_file(date, filename)
+        return result[0] if result else None
+
+    def get_recording_file(self, date: str, filename: str) -> Optional[tuple[Path, os.stat_result]]:
+        """Get full path and stat result of a recording file with a single stat call."""
         file_path = self.output_dir / date / filename
-        if file_path.exists() and file_path.is_file():
-            return file_path
-        return None
+        try:
+            file_stat = file_path.stat()
+        except OSError:
+            return None
+        if not stat.S_ISREG(file_stat.st_mode):
+            return None
+        return file_path, file_stat
 
     def delete_recording(self, date: str, filename: str) -> bool:
         """Delete a recording file."""
         file_path = self.output_dir / date / filename
         if file_path.exists() and file_path.is_file():
+            size = file_path.stat().st_size
             file_path.unlink()
+            if self.storage_manager:
+                self.storage_manager.register_deletion(size)
             # Remove empty date directory
             date_dir = self.output_dir / date
             if date_dir.exists() and not any(date_dir.iterdir()):
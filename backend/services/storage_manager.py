@@ -1,24 +1,51 @@
 import asyncio
 import logging
-import shutil
+import os
+import time
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Optional
 
-from backend.config import runtime_settings
+from backend import config
 from backend.websocket.manager import ConnectionManager
 
 logger = logging.getLogger(__name__)
 
+_GB = 1 / (1024 ** 3)
+
 
 class StorageManager:
     """Manages storage cleanup and disk monitoring."""
 
+    # Full directory walks only run this often; in between, sizes are kept
+    # current from the recorder's finished segments and cleanup's deletions
+    RECONCILE_INTERVAL = 3600
+    # Storage stats are served from cache for this many seconds
+    STATS_TTL = 30
+    # Cleanup runs when kicked (new segment, low disk) but at most this often,
+    # and at least every CLEANUP_INTERVAL without a kick
+    MIN_CLEANUP_INTERVAL = 60
+    CLEANUP_INTERVAL = 3600
+    # Below this free-space fraction the oldest recordings are deleted regardless
+    # of retention, until LOW_DISK_TARGET_FRACTION is free again
+    LOW_DISK_FRACTION = 0.10
+    LOW_DISK_TARGET_FRACTION = 0.15
+
     def __init__(self, data_dir: Path, ws_manager: ConnectionManager):
         self.data_dir = data_dir
         self.ws_manager = ws_manager
         self._running = False
         self._task: Optional[asyncio.Task] = None
+        self._data_bytes: Optional[int] = None
+        self._recordings_bytes: Optional[int] = None
+        self._reconciled_at = 0.0
+        self._reconcile_lock = asyncio.Lock()
+        # (recordings, data) byte changes registered while a reconcile walk runs
+        self._scan_delta: Optional[list[int]] = None
+        self._stats_cache: Optional[tuple[float, dict]] = None
+        self._kick = asyncio.Event()
+        # Set when a low-disk pass found nothing left to delete; cleared by new segments
+        self._low_disk_exhausted = False
 
     async def start_cleanup_task(self):
         """Start periodic cleanup task."""
@@ -38,50 +65,92 @@ class StorageManager:
         logger.info("Storage manager stopped")
 
     async def _cleanup_loop(self):
-        """Periodic cleanup loop - runs every 10 minutes."""
+        """Cleanup loop - runs when kicked, throttled, with an hourly fallback."""
         while self._running:
+            started = time.monotonic()
+            self._kick.clear()
             try:
+                if started - self._reconciled_at >= self.RECONCILE_INTERVAL:
+                    await self._reconcile_sizes()
                 await self.cleanup_old_recordings()
+                await self.free_disk_space()
                 await self.broadcast_storage_stats()
             except Exception as e:
                 logger.error(f"Cleanup error: {e}")
 
-            await asyncio.sleep(600)  # 10 minutes
+            try:
+                await asyncio.wait_for(self._kick.wait(), timeout=self.CLEANUP_INTERVAL)
+            except asyncio.TimeoutError:
+                continue
+            # Kicked: honour the minimum spacing between runs
+            remaining = self.MIN_CLEANUP_INTERVAL - (time.monotonic() - started)
+            if remaining > 0:
+                await asyncio.sleep(remaining)
+
+    def kick_cleanup(self):
+        """Request a cleanup run soon, e.g. after a new segment is written."""
+        self._kick.set()
 
     async def cleanup_old_recordings(self):
         """Remove recordings older than retention period."""
-        retention_hours = runtime_settings.retention_hours
+        retention_hours = config.runtime_settings.retention_hours
         cutoff_time = datetime.now() - timedelta(hours=retention_hours)
 
         recordings_dir = self.data_dir / "recordings"
         deleted_count = 0
         deleted_size = 0
 
-        for date_dir in recordings_dir.glob("*"):
-            if not date_dir.is_dir():
+        # Date directories and segment names sort chronologically, so whole newer
+        # days are skipped and each day stops at its first segment past the cutoff
+        cutoff_date = cutoff_time.strftime("%Y-%m-%d")
+        cutoff_stamp = int(cutoff_time.strftime("%Y%m%d%H%M%S"))
+
+        try:
+            with os.scandir(recordings_dir) as entries:
+                date_dirs = sorted(e.path for e in entries if e.is_dir() and e.name <= cutoff_date)
+        except FileNotFoundError:
+            date_dirs = []
+
+        for date_dir in date_dirs:
+            with os.scandir(date_dir) as entries:
+                names = sorted(e.name for e in entries)
+            recordings = [name for name in names if name.endswith(".mp4")]
+
+            to_delete = []
+            for name in recordings:
+                try:
+                    # Filename is YYYYMMDD_HHMMSS.mp4
+                    file_stamp = int(name[:8] + name[9:15])
+                    if name[8] != "_":
+                        raise ValueError(f"unexpected recording name {name}")
+                except (ValueError, IndexError) as e:
+                    logger.warning(f"Could not process {date_dir}/{name}: {e}")
+                    continue
+                if file_stamp >= cutoff_stamp:
+                    break
+                to_delete.append(os.path.join(date_dir, name))
+
+            if not to_delete:
                 continue
 
-            for recording in date_dir.glob("*.mp4"):
+            # Unlinking is blocking I/O; do the whole day's batch off the event loop
+            deleted = await asyncio.to_thread(self._batch_unlink, to_delete)
+            for path, size in deleted:
+                self.register_deletion(size)
+                deleted_size += size
+                logger.info(f"Deleted old recording: {path}")
+            deleted_count += len(deleted)
+
+            # The listing above already says whether anything else is left
+            if len(deleted) == len(names):
                 try:
-                    # Parse timestamp from filename: YYYYMMDD_HHMMSS.mp4
-                    filename = recording.stem
-                    file_time = datetime.strptime(filename, "%Y%m%d_%H%M%S")
-
-                    if file_time < cutoff_time:
-                        size = recording.stat().st_size
-                        recording.unlink()
-                        deleted_count += 1
-                        deleted_size += size
-                        logger.info(f"Deleted old recording: {recording}")
-                except (ValueError, OSError) as e:
-                    logger.warning(f"Could not process {recording}: {e}")
-
-            # Remove empty date directories
-            if date_dir.exists() and not any(date_dir.iterdir()):
-                date_dir.rmdir()
-                logger.info(f"Removed empty directory: {date_dir}")
+                    os.rmdir(date_dir)
+                    logger.info(f"Removed empty directory: {date_dir}")
+                except OSError:
+                    pass  # The recorder wrote a new segment here meanwhile
 
         if deleted_count > 0:
+            self._stats_cache = None
             logger.info(
                 f"Cleanup complete: deleted {deleted_count} files, "
                 f"freed {deleted_size / (1024 * 1024):.2f} MB"
@@ -90,37 +159,133 @@ class StorageManager:
         # Also cleanup old thumbnails (keep 24 hours)
         await self.cleanup_old_thumbnails()
 
+    async def free_disk_space(self):
+        """Delete the oldest recordings while free space is below LOW_DISK_FRACTION."""
+        if self._free_fraction() >= self.LOW_DISK_FRACTION:
+            self._low_disk_exhausted = False
+            return
+
+        recordings_dir = self.data_dir / "recordings"
+        try:
+            with os.scandir(recordings_dir) as entries:
+                date_dirs = sorted(e.path for e in entries if e.is_dir())
+        except FileNotFoundError:
+            date_dirs = []
+
+        # Oldest first; the newest segment is skipped as the recorder may still be writing it
+        candidates = []
+        for date_dir in date_dirs:
+            with os.scandir(date_dir) as entries:
+                candidates.extend(sorted(e.path for e in entries if e.name.endswith(".mp4")))
+        candidates = candidates[:-1]
+
+        deleted = await asyncio.to_thread(self._unlink_until_free, candidates)
+        if not deleted:
+            self._low_disk_exhausted = True
+            logger.warning("Disk space low and no recordings left to delete")
+            return
+
+        deleted_size = 0
+        for path, size in deleted:
+            self.register_deletion(size)
+            deleted_size += size
+        self._stats_cache = None
+
+        # Remove past days emptied here; today's and tomorrow's are kept for the recorder
+        today = datetime.now().strftime("%Y-%m-%d")
+        for date_dir in {os.path.dirname(path) for path, _ in deleted}:
+            if os.path.basename(date_dir) < today:
+                try:
+                    os.rmdir(date_dir)
+                except OSError:
+                    pass  # Still holds segments
+
+        logger.warning(
+            f"Disk space low: deleted {len(deleted)} oldest recordings, "
+            f"freed {deleted_size / (1024 * 1024):.2f} MB"
+        )
+
+    def _free_fraction(self) -> float:
+        """Fraction of the data filesystem available to unprivileged writers."""
+        fs = os.statvfs(self.data_dir)
+        return fs.f_bavail / fs.f_blocks if fs.f_blocks else 1.0
+
+    def _unlink_until_free(self, paths: list[str]) -> list[tuple[str, int]]:
+        """Delete files in order until LOW_DISK_TARGET_FRACTION is free (blocking)."""
+        deleted = []
+        for path in paths:
+            if self._free_fraction() >= self.LOW_DISK_TARGET_FRACTION:
+                break
+            deleted.extend(self._batch_unlink([path]))
+        return deleted
+
+    @staticmethod
+    def _batch_unlink(paths: list[str]) -> list[tuple[str, int]]:
+        """Delete files, returning (path, size) for each one removed."""
+        deleted = []
+        for path in paths:
+            try:
+                size = os.stat(path).st_size
+                os.unlink(path)
+            except OSError as e:
+                logger.warning(f"Could not delete {path}: {e}")
+                continue
+            deleted.append((path, size))
+        return deleted
+
     async def cleanup_old_thumbnails(self):
         """Remove thumbnails older than 24 hours."""
         thumbnails_dir = self.data_dir / "thumbnails"
         cutoff_time = datetime.now() - timedelta(hours=24)
 
-        for thumbnail in thumbnails_dir.glob("*.jpg"):
-            try:
-                mtime = datetime.fromtimestamp(thumbnail.stat().st_mtime)
-                if mtime < cutoff_time:
-                    thumbnail.unlink()
-            except OSError:
-                pass
+        cutoff = cutoff_time.timestamp()
 
-    def get_storage_stats(self) -> dict:
-        """Get disk storage statistics."""
         try:
-            total, used, free = shutil.disk_usage(self.data_dir)
+            with os.scandir(thumbnails_dir) as entries:
+                for thumbnail in entries:
+                    if not thumbnail.name.endswith(".jpg"):
+                        continue
+                    try:
+                        thumbnail_stat = thumbnail.stat()
+                        if thumbnail_stat.st_mtime < cutoff:
+                            os.unlink(thumbnail.path)
+                            self.register_deletion(thumbnail_stat.st_size, recording=False)
+                    except OSError:
+                        pass
+        except FileNotFoundError:
+            pass
 
-            # Calculate data directory size
-            data_size = self._get_directory_size(self.data_dir)
+    async def get_storage_stats(self) -> dict:
+        """Get disk storage statistics, computed off the event loop and cached briefly."""
+        now = time.monotonic()
+        if self._stats_cache is None or now - self._stats_cache[0] >= self.STATS_TTL:
+            # Directory sizes are tracked incrementally; walk only before the first reconcile
+            if self._data_bytes is None or self._recordings_bytes is None:
+                await self._reconcile_sizes()
+            stats = await asyncio.to_thread(self._compute_stats)
+            self._stats_cache = (now, stats)
+        # Callers add their own fields, so never hand out the cached dict itself
+        return dict(self._stats_cache[1])
 
-            # Get recordings size
-            recordings_size = self._get_directory_size(self.data_dir / "recordings")
+    def _compute_stats(self) -> dict:
+        """Compute disk storage statistics (blocking)."""
+        try:
+            # Same figures as shutil.disk_usage, straight from statvfs
+            fs = os.statvfs(self.data_dir)
+            total = fs.f_blocks * fs.f_frsize
+            free = fs.f_bavail * fs.f_frsize
+            used = (fs.f_blocks - fs.f_bfree) * fs.f_frsize
+
+            data_size = self._data_bytes
+            recordings_size = self._recordings_bytes
 
             return {
-                "total_gb": round(total / (1024 ** 3), 2),
-                "used_gb": round(used / (1024 ** 3), 2),
-                "free_gb": round(free / (1024 ** 3), 2),
+                "total_gb": round(total * _GB, 2),
+                "used_gb": round(used * _GB, 2),
+                "free_gb": round(free * _GB, 2),
                 "used_percent": round((used / total) * 100, 1),
-                "data_size_gb": round(data_size / (1024 ** 3), 2),
-                "recordings_size_gb": round(recordings_size / (1024 ** 3), 2),
+                "data_size_gb": round(data_size * _GB, 2),
+                "recordings_size_gb": round(recordings_size * _GB, 2),
             }
         except Exception as e:
             logger.error(f"Error getting storage stats: {e}")
@@ -133,20 +298,81 @@ class StorageManager:
                 "recordings_size_gb": 0,
             }
 
-    def _get_directory_size(self, path: Path) -> int:
-        """Calculate total size of a directory."""
+    def register_new_segment(self, size: int):
+        """Account for a recording segment the recorder has finished writing."""
+        # A finished segment is something a low-disk pass can delete again
+        self._low_disk_exhausted = False
+        if self._scan_delta is not None:
+            self._scan_delta[0] += size
+            self._scan_delta[1] += size
+        if self._recordings_bytes is not None and self._data_bytes is not None:
+            self._recordings_bytes += size
+            self._data_bytes += size
+
+    def register_deletion(self, size: int, recording: bool = True):
+        """Account for a file removed from the data directory."""
+        if self._scan_delta is not None:
+            self._scan_delta[1] -= size
+            if recording:
+                self._scan_delta[0] -= size
+        if self._data_bytes is not None:
+            self._data_bytes = max(0, self._data_bytes - size)
+        if recording and self._recordings_bytes is not None:
+            self._recordings_bytes = max(0, self._recordings_bytes - size)
+
+    async def _reconcile_sizes(self):
+        """Recount data and recordings sizes in one walk of the data directory.
+
+        The walk runs off the event loop; segments and deletions registered
+        meanwhile are applied on top of its totals instead of being overwritten.
+        """
+        async with self._reconcile_lock:
+            self._scan_delta = [0, 0]
+            try:
+                recordings_size, other_size = await asyncio.to_thread(self._scan_sizes)
+                self._recordings_bytes = max(0, recordings_size + self._scan_delta[0])
+                self._data_bytes = max(0, recordings_size + other_size + self._scan_delta[1])
+                self._reconciled_at = time.monotonic()
+            finally:
+                self._scan_delta = None
+
+    def _scan_sizes(self) -> tuple[int, int]:
+        """Walk the data directory, returning (recordings bytes, other bytes) (blocking)."""
+        recordings_dir = self.data_dir / "recordings"
+        recordings_size = self._get_directory_size(recordings_dir)
+        other_size = self._get_directory_size(self.data_dir, skip=str(recordings_dir))
+        return recordings_size, other_size
+
+    def _get_directory_size(self, path: Path, skip: Optional[str] = None) -> int:
+        """Calculate total size of a directory, leaving out the subdirectory skip.
+
+        scandir entries carry the file type from readdir, so only regular files
+        cost a stat call.
+        """
         total = 0
-        try:
-            for entry in path.rglob("*"):
-                if entry.is_file():
-                    total += entry.stat().st_size
-        except OSError:
-            pass
+        stack = [str(path)]
+        while stack:
+            try:
+                with os.scandir(stack.pop()) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if entry.path != skip:
+                                    stack.append(entry.path)
+                            elif entry.is_file(follow_symlinks=False):
+                                total += entry.stat(follow_symlinks=False).st_size
+                        except OSError:
+                            pass  # Removed while walking
+            except OSError:
+                pass
         return total
 
     async def broadcast_storage_stats(self):
         """Broadcast storage stats via WebSocket."""
-        stats = self.get_storage_stats()
+        stats = await self.get_storage_stats()
+        low_disk = stats["total_gb"] and stats["free_gb"] / stats["total_gb"] < self.LOW_DISK_FRACTION
+        if low_disk and not self._low_disk_exhausted:
+            self.kick_cleanup()
         await self.ws_manager.send_storage_update(
             stats["total_gb"],
             stats["used_gb"],
@@ -155,5 +381,13 @@ class StorageManager:
 
     def get_recordings_count(self) -> int:
         """Get total number of recording files."""
-        recordings_dir = self.data_dir / "recordings"
-        return sum(1 for _ in recordings_dir.rglob("*.mp4"))
+        count = 0
+        try:
+            with os.scandir(self.data_dir / "recordings") as date_dirs:
+                for date_dir in date_dirs:
+                    if date_dir.is_dir(follow_symlinks=False):
+                        with os.scandir(date_dir.path) as entries:
+                            count += sum(1 for e in entries if e.name.endswith(".mp4"))
+        except FileNotFoundError:
+            pass
+        return count
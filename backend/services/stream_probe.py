@@ -0,0 +1,80 @@
+import asyncio
+import json
+import logging
+import shutil
+import time
+
+logger = logging.getLogger(__name__)
+
+# Resolve ffprobe once instead of scanning PATH on every probe
+FFPROBE = shutil.which("ffprobe") or "ffprobe"
+
+# Successful probe results keyed by RTSP URL: url -> (monotonic time, result)
+PROBE_CACHE_TTL = 60
+_probe_cache: dict[str, tuple[float, dict]] = {}
+
+
+async def _run_ffprobe(rtsp_url: str) -> dict:
+    """Probe an RTSP stream using ffprobe to get resolution and bitrate."""
+    process = None
+    try:
+        cmd = [
+            FFPROBE,
+            "-v", "quiet",
+            "-rtsp_transport", "tcp",
+            "-print_format", "json",
+            "-show_streams",
+            "-analyzeduration", "2000000",
+            "-probesize", "2000000",
+            rtsp_url
+        ]
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=10)
+        if process.returncode != 0:
+            return {"error": f"ffprobe failed: {stderr.decode(errors='replace')}"}
+
+        data = json.loads(stdout)
+        streams = data.get("streams", [])
+
+        video_stream = None
+        for s in streams:
+            if s.get("codec_type") == "video":
+                video_stream = s
+                break
+
+        if not video_stream:
+            return {"error": "No video stream found"}
+
+        return {
+            "width": video_stream.get("width", 0),
+            "height": video_stream.get("height", 0),
+            "codec": video_stream.get("codec_name", "unknown"),
+            "fps": video_stream.get("r_frame_rate", "unknown"),
+            "bit_rate": int(video_stream.get("bit_rate", 0)) if video_stream.get("bit_rate") else 0,
+        }
+    except asyncio.TimeoutError:
+        try:
+            process.kill()
+        except ProcessLookupError:
+            pass  # Exited between the timeout and the kill
+        await process.wait()
+        return {"error": "Probe timeout"}
+    except Exception as e:
+        return {"error": str(e)}
+
+
+async def probe_stream(rtsp_url: str, fresh: bool = False) -> dict:
+    """Probe an RTSP stream, reusing a recent successful result if available."""
+    now = time.monotonic()
+    cached = _probe_cache.get(rtsp_url)
+    if not fresh and cached and now - cached[0] < PROBE_CACHE_TTL:
+        return cached[1]
+
+    result = await _run_ffprobe(rtsp_url)
+    if "error" not in result:
+        _probe_cache[rtsp_url] = (now, result)
+    return result
@@ -1,54 +1,73 @@
 import asyncio
-import json
-from typing import Set
+from datetime import datetime
+from typing import Optional, Set
 
+import orjson
 from fastapi import WebSocket
 
 
 class ConnectionManager:
     """Manages WebSocket connections for real-time updates."""
 
+    # Detection events arriving within this window go out as one message
+    DETECTION_BATCH_WINDOW = 0.05
+
     def __init__(self):
+        # Only touched from the event loop with no await mid-update, so no lock is needed
         self.active_connections: Set[WebSocket] = set()
-        self._lock = asyncio.Lock()
+        self._pending_detections: list[dict] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        # Fire-and-forget status broadcasts, referenced until they finish
+        self._status_tasks: Set[asyncio.Task] = set()
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        async with self._lock:
-            self.active_connections.add(websocket)
+        self.active_connections.add(websocket)
 
     async def disconnect(self, websocket: WebSocket):
-        async with self._lock:
-            self.active_connections.discard(websocket)
+        self.active_connections.discard(websocket)
 
     async def broadcast(self, message: dict):
         """Broadcast message to all connected clients."""
         if not self.active_connections:
             return
 
-        message_json = json.dumps(message)
-        disconnected = set()
+        # Encode once for every client; the frontend accepts JSON in binary frames
+        payload = orjson.dumps(message)
 
-        async with self._lock:
-            for connection in self.active_connections:
-                try:
-                    await connection.send_text(message_json)
-                except Exception:
-                    disconnected.add(connection)
+        # Send to a snapshot of the clients concurrently, so one slow client
+        # doesn't delay the others
+        connections = tuple(self.active_connections)
+        results = await asyncio.gather(
+            *(connection.send_bytes(payload) for connection in connections),
+            return_exceptions=True
+        )
 
-            # Remove disconnected clients
-            self.active_connections -= disconnected
+        # Remove disconnected clients
+        disconnected = {c for c, result in zip(connections, results) if isinstance(result, Exception)}
+        self.active_connections.difference_update(disconnected)
 
-    async def send_detection_event(self, timestamp: str, confidence: float, thumbnail_path: str = None):
-        """Broadcast a detection event."""
-        await self.broadcast({
-            "type": "detection",
-            "data": {
-                "timestamp": timestamp,
-                "confidence": confidence,
-                "thumbnail": thumbnail_path
-            }
+    async def send_detection_event(self, timestamp: datetime, confidence: float, thumbnail_path: str = None):
+        """Queue a detection event for the next coalesced broadcast."""
+        self._pending_detections.append({
+            "timestamp": timestamp,
+            "confidence": confidence,
+            "thumbnail": thumbnail_path
         })
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_detections())
+
+    async def _flush_detections(self):
+        """Broadcast detections queued during the batch window in one message."""
+        await asyncio.sleep(self.DETECTION_BATCH_WINDOW)
+        batch, self._pending_detections = self._pending_detections, []
+        # Events queued while this broadcast is in flight start a new window
+        self._flush_task = None
+
+        if len(batch) == 1:
+            await self.broadcast({"type": "detection", "data": batch[0]})
+        elif batch:
+            await self.broadcast({"type": "detection_batch", "data": batch})
 
     async def send_status_update(self, service: str, status: str, message: str = ""):
         """Broadcast a service status update."""
@@ -61,6 +80,12 @@ class ConnectionManager:
             }
         })
 
+    def send_status_nowait(self, service: str, status: str, message: str = ""):
+        """Schedule a status update without waiting for clients to receive it."""
+        task = asyncio.create_task(self.send_status_update(service, status, message))
+        self._status_tasks.add(task)
+        task.add_done_callback(self._status_tasks.discard)
+
     async def send_storage_update(self, total_gb: float, used_gb: float, free_gb: float):
         """Broadcast storage statistics."""
         await self.broadcast({
@@ -6,6 +6,7 @@ class WebSocketClient {
     this.ws = null;
     this.reconnectDelay = 1000;
     this.maxReconnectDelay = 30000;
+    this.decoder = new TextDecoder();
     this.listeners = {
       detection: [],
       status: [],
@@ -21,6 +22,7 @@ class WebSocketClient {
 
     try {
       this.ws = new WebSocket(wsUrl);
+      this.ws.binaryType = 'arraybuffer';
 
       this.ws.onopen = () => {
         console.log('WebSocket connected');
@@ -57,9 +59,17 @@ class WebSocketClient {
 
   _handleMessage(data) {
     try {
-      const message = JSON.parse(data);
+      // Server may send JSON as binary frames
+      const text = typeof data === 'string' ? data : this.decoder.decode(data);
+      const message = JSON.parse(text);
       const { type, data: payload } = message;
 
+      // Coalesced detections: listeners only refresh, so notify once with the latest
+      if (type === 'detection_batch') {
+        this._emit('detection', payload[payload.length - 1]);
+        return;
+      }
+
       if (type && this.listeners[type]) {
         this._emit(type, payload);
       }
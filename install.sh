@@ -36,7 +36,7 @@ source venv/bin/activate
 # Install Python dependencies
 echo "Installing Python dependencies..."
 pip install --upgrade pip
-pip install fastapi uvicorn python-telegram-bot opencv-python-headless pillow pydantic pydantic-settings aiosqlite numpy
+pip install -r requirements.txt
 
 # Create data directories
 echo "Creating data directories..."
@@ -6,6 +6,8 @@ Run with: python run.py
 Or: uvicorn backend.main:app --reload
 """
 
+from importlib.util import find_spec
+
 import uvicorn
 
 from backend.config import settings
@@ -24,7 +26,11 @@ def main():
         host=settings.host,
         port=settings.port,
         reload=False,
-        log_level="info"
+        log_level="info",
+        # uvloop and httptools are faster; fall back where they are not installed
+        loop="uvloop" if find_spec("uvloop") else "asyncio",
+        http="httptools" if find_spec("httptools") else "h11",
+        ws="websockets"
     )
 
 